@@ -0,0 +1,61 @@
+import os
+import re
+
+from kivy.atlas import Atlas
+
+from imagelib import ATLAS_FOLDER
+from spriteindex import ROOT
+
+
+ATLAS_SIZE = 1024
+
+# every atlas, with the folders and file pattern of the images packed in it
+ATLASES = {
+    'chars': (['Images/chars/*'], re.compile(r'^.+_anim_f\d+\.png$')),
+    'food': (['Images/food'], re.compile(r'^.+\.png$')),
+    'floor': (['Images/bg'], re.compile(r'^floor_\d+\.png$')),
+}
+
+
+def find_images(folders, pattern):
+    ''' returns the images inside the folders whose name match the pattern
+
+    Keyword arguments:
+    folders -- folders relative to the project; a trailing '*' includes
+               every sub-folder instead
+    pattern -- compiled regex the file name has to match
+    '''
+    directories = []
+    for folder in folders:
+        base = os.path.join(ROOT, folder.rstrip('*'))
+        if folder.endswith('*'):
+            directories.extend(os.path.join(base, d)
+                               for d in sorted(os.listdir(base)))
+        else:
+            directories.append(base)
+
+    images = []
+    for d in directories:
+        if not os.path.isdir(d):
+            continue
+        images.extend(os.path.join(d, f) for f in sorted(os.listdir(d))
+                      if pattern.match(f))
+    return images
+
+
+def pack(name, size=ATLAS_SIZE):
+    ''' packs all images of an atlas into Images/atlas/<name>.atlas and
+    returns the amount of images packed
+    '''
+    folders, pattern = ATLASES[name]
+    images = find_images(folders, pattern)
+    out_folder = os.path.join(ROOT, ATLAS_FOLDER)
+    if not os.path.isdir(out_folder):
+        os.mkdir(out_folder)
+    Atlas.create(os.path.join(out_folder, name), images, size)
+    return len(images)
+
+
+if __name__ == '__main__':
+    for name in ATLASES:
+        print ("Packed " + str(pack(name)) + " images into " + name)
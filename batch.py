@@ -0,0 +1,277 @@
+import argparse
+import collections
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from behaviours import cafe_ai
+from orders import LEFT, PLACED, CafeOrders
+from simulation import (ItemEntity, NonPlayerEntity, PlayerEntity,
+                        Simulation)
+from spriteindex import food_names
+
+
+# the patrol given to every NPC when no waypoints are asked for
+PATROL = [(0, 0), (20, 0), (0, 20), (-20, 0), (0, -20)]
+NPC_SPRITE = 'Images/chars/big_demon/big_demon_idle_anim_f0.png'
+PLAYER_SPRITE = 'Images/chars/skelet/skelet_idle_anim_f0.png'
+DIRECTIONS = {'left': (-1, 0), 'right': (1, 0),
+              'up': (0, 1), 'down': (0, -1)}
+SCRIPT = 'right:10,up:10,left:10,down:10'
+
+Scenario = collections.namedtuple(
+    'Scenario', ['name', 'npcs', 'items', 'size', 'ticks', 'runs', 'seed',
+                 'script', 'spawn_every', 'waypoints', 'ai'],
+    defaults=(10, 0, (800, 600), 600, 1, 0, SCRIPT, 0, 0, False))
+
+
+def spawn_item(simulation, rng, foods):
+    ''' places a randomly picked food item at a random spot '''
+    food = rng.choice(foods)
+    e = ItemEntity.from_sprite('Images/food/' + food + '.png', food.lower())
+    e.x = rng.randint(0, max(simulation.width - e.width, 0))
+    e.y = rng.randint(0, max(simulation.height - e.height, 0))
+    simulation.add_entity(e)
+    return e
+
+
+def build_scene(npcs, items, size, rng, waypoints=0, ai=False):
+    ''' builds a cafe of randomly placed entities, sized from the sprite
+    index, without any widget
+
+    Keyword arguments:
+    npcs        -- the amount of NPCs, all patrolling
+    items       -- the amount of randomly picked food items
+    size        -- (width, height) of the cafe
+    rng         -- the random generator every placement is taken from
+    waypoints   -- the amount of cells the NPCs patrol through, found with
+                   the navigation grid; the fixed PATROL is used if 0
+    ai          -- if the NPCs are given behaviours and order food as in
+                   the game instead of patrolling, thinking without a time
+                   budget so that sessions stay reproducible
+    '''
+    width, height = size
+    simulation = Simulation(
+        width, height, PlayerEntity.from_sprite(PLAYER_SPRITE, "skelet"))
+
+    for i in range(npcs):
+        e = NonPlayerEntity.from_sprite(
+            NPC_SPRITE, "big_demon" + str(i),
+            movement_list=None if ai else PATROL)
+        e.x = rng.randint(0, max(width - e.width, 0))
+        e.y = rng.randint(0, max(height - e.height, 0))
+        simulation.add_entity(e)
+
+    foods = food_names()
+    for i in range(items):
+        spawn_item(simulation, rng, foods)
+
+    if waypoints:
+        grid = simulation.navigation
+        route = [(rng.randrange(grid.cols), rng.randrange(grid.rows))
+                 for i in range(waypoints)]
+        for e in simulation.population.entities:
+            simulation.route_patrol(e, route)
+    if ai:
+        simulation.ai = cafe_ai(simulation, rng.getrandbits(32))
+        simulation.ai.budget = None
+        simulation.orders = CafeOrders(simulation,
+                                       random.Random(rng.getrandbits(32)))
+    return simulation
+
+
+def parse_script(script):
+    ''' returns the moves of a player input script, as (key, ticks, sprint)
+
+    Keyword arguments:
+    script  -- comma separated "key:ticks" moves, a key of "shift+key"
+               sprinting and a key of "wait" not moving; "random" walks
+               randomly instead
+    '''
+    if script == 'random':
+        return None
+    moves = []
+    for move in script.split(','):
+        key, ticks = move.strip().split(':')
+        sprint = key.startswith('shift+')
+        key = key[len('shift+'):] if sprint else key
+        if key != 'wait' and key not in DIRECTIONS:
+            raise ValueError("unknown key in script: " + key)
+        moves.append((key, int(ticks), sprint))
+    return moves
+
+
+def scripted_input(moves, rng):
+    ''' yields the (key, sprint) pressed on every tick, looping over the
+    script, or random ones if there is no script
+    '''
+    keys = sorted(DIRECTIONS) + ['wait']
+    while True:
+        if moves is None:
+            key = rng.choice(keys)
+            for i in range(rng.randint(1, 20)):
+                yield key, False
+            continue
+        for key, ticks, sprint in moves:
+            for i in range(ticks):
+                yield key, sprint
+
+
+def run_session(scenario, run):
+    ''' runs a single seeded session of a scenario as fast as possible,
+    returning its stats
+
+    Keyword arguments:
+    scenario    -- the Scenario to run
+    run         -- the index of the session, which along with the seed of
+                   the scenario seeds it, whichever worker runs it
+    '''
+    rng = random.Random(scenario.seed * 1000003 + run)
+    simulation = build_scene(scenario.npcs, scenario.items, scenario.size,
+                             rng, scenario.waypoints, scenario.ai)
+    player = simulation.player
+    foods = food_names()
+    presses = scripted_input(parse_script(scenario.script), rng)
+
+    encounters, walked = 0, 0
+    start = time.perf_counter()
+    for tick in range(scenario.ticks):
+        if scenario.spawn_every and tick % scenario.spawn_every == 0:
+            spawn_item(simulation, rng, foods)
+
+        key, sprint = next(presses)
+        if key == 'wait':
+            player.idle()
+        else:
+            x, y = player.pos
+            picked_up, npc = simulation.move_player(DIRECTIONS[key], sprint)
+            walked += abs(player.x - x) + abs(player.y - y)
+            encounters += npc is not None
+        simulation.step()
+    elapsed = time.perf_counter() - start
+
+    items_left = sum(isinstance(e, ItemEntity) for e in simulation.entities)
+    stats = {'scenario': scenario.name, 'run': run,
+             'picked_up': len(player.bag),
+             'items_left': items_left,
+             'npc_encounters': encounters,
+             'walked': walked,
+             'ticks_per_s': scenario.ticks / max(elapsed, 1e-9),
+             'bag': sorted(player.bag.items)}
+    if simulation.ai is not None:
+        stats['ai_thinks_per_tick'] = (simulation.ai.total_thinks
+                                       / max(scenario.ticks, 1))
+        stats['ai_ms_per_tick'] = (simulation.ai.total_cost * 1000
+                                   / max(scenario.ticks, 1))
+    if simulation.orders is not None:
+        stats['orders_placed'] = simulation.orders.counts[PLACED]
+        stats['orders_left'] = simulation.orders.counts[LEFT]
+    return stats
+
+
+def _run_task(task):
+    return run_session(*task)
+
+
+def aggregate(results):
+    ''' returns the mean, min and max of every numeric stat of the runs of
+    each scenario
+    '''
+    by_scenario = collections.OrderedDict()
+    for result in results:
+        by_scenario.setdefault(result['scenario'], []).append(result)
+
+    summary = collections.OrderedDict()
+    for name, runs in by_scenario.items():
+        stats = {'runs': len(runs)}
+        for key, value in runs[0].items():
+            if key == 'run' or not isinstance(value, (int, float)):
+                continue
+            values = [r[key] for r in runs]
+            stats[key] = {'mean': statistics.mean(values),
+                          'min': min(values), 'max': max(values)}
+        summary[name] = stats
+    return summary
+
+
+def run_batch(scenarios, workers=None):
+    ''' runs every session of every scenario across a pool of processes,
+    returning the stats of each session in order
+
+    Keyword arguments:
+    scenarios   -- the Scenarios to run
+    workers     -- the amount of processes, one per core if None
+    '''
+    tasks = [(s, run) for s in scenarios for run in range(s.runs)]
+    if workers == 1:
+        return [_run_task(t) for t in tasks]
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(_run_task, tasks,
+                                 chunksize=max(1, len(tasks) // 32)))
+
+
+def load_scenarios(filename):
+    ''' reads a JSON list of scenarios, each an object with the fields of
+    Scenario of which only the name is required
+    '''
+    with open(filename) as f:
+        data = json.load(f)
+    scenarios = []
+    for entry in data:
+        if 'size' in entry:
+            entry['size'] = tuple(entry['size'])
+        scenarios.append(Scenario(**entry))
+    return scenarios
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run seeded headless Monster Cafe sessions in parallel.')
+    parser.add_argument('scenarios', nargs='?', default=None,
+                        help='JSON file of scenarios; a single scenario '
+                             'made of the options below is run if omitted')
+    parser.add_argument('--npcs', type=int, default=10)
+    parser.add_argument('--items', type=int, default=0)
+    parser.add_argument('--size', type=int, nargs=2, default=[800, 600],
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--runs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', default=SCRIPT,
+                        help='player input, as comma separated key:ticks '
+                             'moves, or "random"')
+    parser.add_argument('--spawn-every', type=int, default=0,
+                        help='ticks between item spawns, never if 0')
+    parser.add_argument('--waypoints', type=int, default=0,
+                        help='cells the NPCs patrol through, found with '
+                             'the navigation grid')
+    parser.add_argument('--ai', action='store_true',
+                        help='give the NPCs behaviours and have them order '
+                             'food instead of patrolling')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes used, one per core by default')
+    parser.add_argument('--sessions', action='store_true',
+                        help='also output the stats of every session')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.scenarios is not None:
+        scenarios = load_scenarios(args.scenarios)
+    else:
+        scenarios = [Scenario('default', args.npcs, args.items,
+                              tuple(args.size), args.ticks, args.runs,
+                              args.seed, args.script, args.spawn_every,
+                              args.waypoints, args.ai)]
+
+    start = time.perf_counter()
+    results = run_batch(scenarios, args.workers)
+    output = {'elapsed_s': time.perf_counter() - start,
+              'scenarios': aggregate(results)}
+    if args.sessions:
+        output['sessions'] = results
+    print (json.dumps(output, indent=2))
@@ -0,0 +1,391 @@
+import collections
+import heapq
+import random
+import time
+
+from debugger import profiled
+from orders import counter_cell
+
+
+def walking(entity):
+    ''' checks if an NPC is on its way somewhere '''
+    return bool(entity.movement_list)
+
+
+class Behaviour(object):
+    ''' what an NPC does, decided a think at a time by the AIScheduler;
+    every NPC has its own behaviour, which keeps what it is up to
+    '''
+
+    def think(self, entity, ai):
+        ''' decides what the NPC does next
+
+        Keyword arguments:
+        entity  -- the NPC
+        ai      -- the AIScheduler running it, with the simulation and the
+                   random generator every decision is taken from
+        '''
+        pass
+
+
+    def leave(self, entity, ai):
+        ''' lets go of anything the NPC holds, once it is removed '''
+        pass
+
+
+class Patrol(Behaviour):
+    ''' keeps walking the patrol the NPC was given '''
+
+
+class Wander(Behaviour):
+    ''' walks to random cells around where the NPC stands, resting a few
+    thinks in between
+    '''
+    # the cells away from the NPC it walks to at most
+    RADIUS = 4
+    # the thinks rested between two walks at most
+    REST = 3
+
+    def __init__(self, radius=None):
+        self.radius = radius if radius is not None else self.RADIUS
+        self.rest = 0
+
+
+    def think(self, entity, ai):
+        if walking(entity):
+            return
+        if self.rest > 0:
+            self.rest -= 1
+            return
+        self.rest = ai.rng.randint(1, self.REST)
+        col, row = ai.cell_of(entity)
+        radius = range(-self.radius, self.radius + 1)
+        cells = ai.free_cells([(col + x, row + y)
+                               for x in radius for y in radius], entity)
+        if cells:
+            ai.route_to(entity, ai.rng.choice(cells))
+
+
+class CounterQueue(object):
+    ''' the line of NPCs waiting at the counter, shared by all of them;
+    the first one stands on the counter's cell and the others below it
+    '''
+    LENGTH = 3
+    # the rows between two NPCs of the line, as NPCs standing still
+    # block the cells under them
+    SPACING = 5
+
+    def __init__(self, cell, length=None):
+        self.cell = cell
+        self.length = length if length is not None else self.LENGTH
+        self.line = []
+
+
+    def join(self, entity):
+        ''' puts an NPC at the end of the line, returning if there was
+        room for it
+        '''
+        if entity not in self.line:
+            if len(self.line) >= self.length:
+                return False
+            self.line.append(entity)
+        return True
+
+
+    def leave(self, entity):
+        if entity in self.line:
+            self.line.remove(entity)
+
+
+    def spot(self, entity):
+        ''' returns the cell an NPC of the line waits on '''
+        col, row = self.cell
+        return (col, row - self.line.index(entity) * self.SPACING)
+
+
+class QueueAtCounter(Behaviour):
+    ''' walks to the counter and waits in line to be served, then wanders
+    away for a while before coming back; NPCs finding the line full wander
+    until there is room
+
+    in a cafe taking orders, being served places an order, and the NPC
+    wanders until it is closed
+    '''
+    # the thinks the first NPC of the line is served for
+    SERVE = 4
+    # the thinks spent wandering once served
+    AWAY = 8
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.served = 0
+        self.away = 0
+        self.wander = Wander()
+
+
+    def think(self, entity, ai):
+        orders = ai.simulation.orders
+        if (self.away > 0
+                or (orders is not None and orders.order_of(entity))
+                or not self.queue.join(entity)):
+            self.away = max(self.away - 1, 0)
+            self.wander.think(entity, ai)
+            return
+        if walking(entity):
+            return
+        spot = self.queue.spot(entity)
+        if ai.cell_of(entity) != spot:
+            # the spot may be taken by someone standing there, in which
+            # case the NPC tries again on its next think
+            if ai.free_cells([spot], entity):
+                ai.route_to(entity, spot)
+            return
+        if self.queue.line[0] is entity:
+            self.served += 1
+            if self.served >= self.SERVE:
+                self.served = 0
+                self.away = self.AWAY
+                self.queue.leave(entity)
+                if orders is not None:
+                    orders.place(entity)
+                self.wander.rest = 0
+                self.wander.think(entity, ai)
+
+
+    def leave(self, entity, ai):
+        self.queue.leave(entity)
+
+
+class Talk(Behaviour):
+    ''' walks up to another NPC and talks with it for a while, then
+    wanders away before going back to it; NPCs that find no way to it
+    wander for a while too
+    '''
+    # the columns between the NPCs talking, as NPCs standing still block
+    # the cells under them
+    SIDE = 4
+    # the cells away from the partner at which the NPC can talk to it
+    REACH = 6
+    # the thinks spent talking, and wandering in between
+    LENGTH = 6
+    AWAY = 4
+    # the nearest NPCs a partner is picked from
+    PARTNERS = 3
+
+    def __init__(self, partner):
+        self.partner = partner
+        self.talked = 0
+        self.away = 0
+        self.wander = Wander()
+
+
+    def think(self, entity, ai):
+        if self.away > 0 or self.partner not in ai.behaviours:
+            self.away = max(self.away - 1, 0)
+            self.wander.think(entity, ai)
+            return
+        if walking(entity):
+            return
+        col, row = ai.cell_of(entity)
+        partner_col, partner_row = ai.cell_of(self.partner)
+        if (abs(col - partner_col) + abs(row - partner_row)
+                <= self.REACH):
+            self.talked += 1
+            if self.talked >= self.LENGTH:
+                self.talked = 0
+                self.away = self.AWAY
+            return
+        cells = ai.free_cells([(partner_col - self.SIDE, partner_row),
+                               (partner_col + self.SIDE, partner_row),
+                               (partner_col, partner_row - self.SIDE),
+                               (partner_col, partner_row + self.SIDE)],
+                              entity)
+        if not cells or not ai.route_to(entity, ai.rng.choice(cells)):
+            # someone may be in the way, until the NPC wandered a bit
+            self.away = self.AWAY
+
+
+class AIScheduler(object):
+    ''' runs the behaviours of the NPCs of a simulation within a budget
+    of time and of thinks per tick: every NPC thinks again after a period
+    that is longer the farther it is from the player and from the part of
+    the cafe shown, those due on the same tick think in the order they
+    were scheduled, and the ones left once the budget is spent keep their
+    place ahead of the others on the next tick
+
+    without a time budget, only the quota limits a tick, so that the same
+    NPCs think on every run of a recording
+    '''
+    # seconds spent thinking per tick, and thinks per tick, at most
+    BUDGET = 0.002
+    QUOTA = 64
+    # ticks between two thinks of NPCs near the player, elsewhere in the
+    # part of the cafe shown, and out of it
+    NEAR, VIEW, FAR = 'near', 'view', 'far'
+    PERIODS = {NEAR: 2, VIEW: 6, FAR: 24}
+    # pixels from the player within which NPCs are near it
+    NEAR_DISTANCE = 256
+    # the cells searched for a path at most, as a think can't be cut
+    # short once started
+    SEARCH_LIMIT = 256
+
+    def __init__(self, simulation, rng=None):
+        self.simulation = simulation
+        self.rng = rng if rng is not None else random.Random()
+        self.budget = self.BUDGET
+        self.quota = self.QUOTA
+        # the (left, bottom, right, top) of the part of the cafe shown
+        self.view = (0, 0, simulation.width, simulation.height)
+        self.behaviours = {}
+        # (tick, order, entity) of the next think of every NPC; entries
+        # whose order is no longer the NPC's are skipped
+        self._due = []
+        self._orders = {}
+        self._order = 0
+        # the level of detail every NPC was last given
+        self._levels = {}
+
+        # seconds spent and thinks run by the last run, and the NPCs it
+        # left due for the next
+        self.cost = 0.0
+        self.thinks = 0
+        self.deferred = 0
+        self.total_cost = 0.0
+        self.total_thinks = 0
+        # runs stopped by the time budget
+        self.overruns = 0
+
+
+    def add(self, entity, behaviour):
+        ''' runs the behaviour of an NPC from the next tick on '''
+        self.behaviours[entity] = behaviour
+        self._schedule(entity, self.simulation.tick, self.NEAR)
+
+
+    def remove(self, entity):
+        behaviour = self.behaviours.pop(entity, None)
+        if behaviour is not None:
+            self._orders.pop(entity)
+            self._levels.pop(entity)
+            behaviour.leave(entity, self)
+
+
+    def _schedule(self, entity, tick, level):
+        heapq.heappush(self._due, (tick, self._order, entity))
+        self._orders[entity] = self._order
+        self._levels[entity] = level
+        self._order += 1
+
+
+    def cell_of(self, entity):
+        ''' returns the navigation cell under the center of an entity '''
+        left, bottom, right, top = entity.hitbox()
+        return self.simulation.navigation.cell_at((left + right) / 2,
+                                                  (bottom + top) / 2)
+
+
+    def route_to(self, entity, cell):
+        ''' sends an NPC to a cell, returning if a path was found '''
+        return self.simulation.route_to(entity, cell, self.SEARCH_LIMIT)
+
+
+    def free_cells(self, cells, entity):
+        ''' returns the cells of a list that are in the cafe and free for
+        an NPC to walk to, those it blocks itself included
+        '''
+        navigation = self.simulation.navigation
+        own = set(self.simulation.obstacle_cells(entity))
+        return [cell for cell in cells if navigation.in_bounds(cell)
+                and navigation.obstacles.get(cell, 0)
+                <= (cell in own)]
+
+
+    def level(self, entity):
+        ''' returns how closely an NPC is followed: NEAR the player, in
+        VIEW or FAR from what is shown
+        '''
+        x = entity.x + entity.width / 2
+        y = entity.y + entity.height / 2
+        left, bottom, right, top = self.view
+        if not (left <= x <= right and bottom <= y <= top):
+            return self.FAR
+        player = self.simulation.player
+        if (player is not None
+                and abs(player.x - entity.x) <= self.NEAR_DISTANCE
+                and abs(player.y - entity.y) <= self.NEAR_DISTANCE):
+            return self.NEAR
+        return self.VIEW
+
+
+    @profiled('AIScheduler.run')
+    def run(self, tick):
+        ''' has the NPCs due by a tick think, until the budget or the
+        quota is spent
+        '''
+        start = time.perf_counter()
+        due, thinks = self._due, 0
+        while due and due[0][0] <= tick:
+            if thinks >= self.quota:
+                break
+            if (self.budget is not None
+                    and time.perf_counter() - start >= self.budget):
+                self.overruns += 1
+                break
+            when, order, entity = heapq.heappop(due)
+            if self._orders.get(entity) != order:
+                continue
+            self.behaviours[entity].think(entity, self)
+            thinks += 1
+            level = self.level(entity)
+            self._schedule(entity, tick + self.PERIODS[level], level)
+
+        self.deferred = 0
+        if due and due[0][0] <= tick:
+            self.deferred = sum(1 for when, order, entity in due
+                                if when <= tick
+                                and self._orders.get(entity) == order)
+        self.cost = time.perf_counter() - start
+        self.thinks = thinks
+        self.total_cost += self.cost
+        self.total_thinks += thinks
+
+
+    def stats(self):
+        ''' returns the budget and the cost of the last run in
+        milliseconds, along with its thinks and the NPCs at every level of
+        detail
+        '''
+        levels = collections.Counter(self._levels.values())
+        return {'budget_ms': (self.budget * 1000
+                              if self.budget is not None else 0),
+                'cost_ms': self.cost * 1000, 'thinks': self.thinks,
+                'deferred': self.deferred, 'overruns': self.overruns,
+                'npcs': len(self.behaviours), self.NEAR: levels[self.NEAR],
+                self.VIEW: levels[self.VIEW], self.FAR: levels[self.FAR]}
+
+
+def cafe_ai(simulation, seed):
+    ''' returns the AI of a cafe filled by MonsterCafe.build, giving each
+    of its NPCs a behaviour picked from a seed: NPCs given a patrol keep
+    it, and the others wander, queue at the counter or talk to one of the
+    NPCs nearest to them; replay.py builds the same AI for a recording
+    '''
+    rng = random.Random(seed)
+    ai = AIScheduler(simulation, rng)
+    queue = CounterQueue(counter_cell(simulation.navigation))
+    npcs = list(simulation.population.entities)
+    for e in npcs:
+        kind = rng.choice((Wander, QueueAtCounter, Talk))
+        if e.movement_list:
+            behaviour = Patrol()
+        elif kind is QueueAtCounter:
+            behaviour = QueueAtCounter(queue)
+        elif kind is Talk and len(npcs) > 1:
+            nearest = sorted((n for n in npcs if n is not e),
+                             key=lambda n: (abs(n.x - e.x)
+                                            + abs(n.y - e.y)))
+            behaviour = Talk(rng.choice(nearest[:Talk.PARTNERS]))
+        else:
+            behaviour = Wander()
+        ai.add(e, behaviour)
+    return ai
@@ -0,0 +1,189 @@
+import os
+# kivy must not mistake the benchmark's arguments for its own
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+
+import kivy
+kivy.require('1.10.1')
+
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.config import Config
+
+from batch import PATROL, build_scene
+from debugger import Profiler
+from simulation import NonPlayerEntity
+
+
+def time_calls(profiler, name, function, calls, *args):
+    ''' times a function called repeatedly, recording it in the profiler '''
+    for i in range(calls):
+        start = time.perf_counter()
+        function(*args)
+        profiler.record(name, time.perf_counter() - start)
+
+
+def time_collisions(profiler, simulation, queries, rng):
+    ''' times the collision checks of the player placed at random spots,
+    returning the amount of checks per second
+    '''
+    player = simulation.player
+    for i in range(queries):
+        player.x = rng.randint(0, max(simulation.width - player.width, 0))
+        player.y = rng.randint(0, max(simulation.height - player.height, 0))
+        simulation.index.update(player, player.hitbox())
+        time_calls(profiler, 'collisions', simulation.overlapping, 1, player)
+    return queries / max(profiler.totals['collisions'], 1e-9)
+
+
+def build_simulation(args, rng):
+    ''' builds the benchmark scene as entities only, sized from the sprite
+    index
+    '''
+    return build_scene(args.npcs, args.items, args.size, rng)
+
+
+def run_headless(args):
+    ''' benchmarks the simulation alone, without kivy widgets '''
+    profiler = Profiler(args.ticks)
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    simulation = build_simulation(args, rng)
+    build_time = time.perf_counter() - start
+
+    time_calls(profiler, 'Simulation.step', simulation.step, args.ticks)
+    throughput = time_collisions(profiler, simulation, args.queries, rng)
+    return build_time, profiler, throughput
+
+
+class BenchmarkApp(App):
+    ''' builds the cafe in a window, benchmarks it and stops '''
+    kv_file = 'monstercafe.kv'
+
+    def __init__(self, args, **kwargs):
+        super().__init__(**kwargs)
+        self.args = args
+        self.profiler = Profiler(args.ticks)
+        self.results = None
+
+
+    def build(self):
+        # the window is created on import, so only once it is configured
+        from monstercafe import MonsterCafe
+
+        self.cafe = MonsterCafe()
+        self.cafe.batched = self.args.batched
+        start = time.perf_counter()
+        self.cafe.plan(self.args.npcs, self.args.items, self.args.seed)
+        self.cafe.build()
+        self.build_time = time.perf_counter() - start
+
+        for e, w in self.cafe._widgets.items():
+            if isinstance(e, NonPlayerEntity):
+                w.set_patrol(PATROL)
+        Clock.schedule_once(self.run_benchmark, 0)
+        return self.cafe
+
+
+    def run_benchmark(self, dt):
+        time_calls(self.profiler, 'MonsterCafe.update_image',
+                   self.cafe.update_image, self.args.ticks)
+        time_calls(self.profiler, 'MonsterCafe.tick',
+                   self.cafe.tick, self.args.ticks)
+        time_calls(self.profiler, 'MonsterCafe.render',
+                   self.cafe.render, self.args.ticks, 0.5)
+        time_calls(self.profiler, 'frame', self.draw_frame, self.args.ticks)
+        throughput = time_collisions(self.profiler, self.cafe.simulation,
+                                     self.args.queries,
+                                     random.Random(self.args.seed))
+        self.results = (self.build_time, self.profiler, throughput)
+        self.stop()
+
+
+    def draw_frame(self):
+        ''' ticks and renders the cafe, then draws the window '''
+        self.cafe.tick()
+        self.cafe.render(0.5)
+        self.root_window.dispatch('on_draw')
+
+
+def run_app(args):
+    ''' benchmarks the cafe with its widgets, in a window of the requested
+    size that is drawn offscreen if asked
+    '''
+    if args.offscreen:
+        os.environ['SDL_VIDEODRIVER'] = 'offscreen'
+    Config.set('graphics', 'width', str(args.size[0]))
+    Config.set('graphics', 'height', str(args.size[1]))
+
+    app = BenchmarkApp(args)
+    app.run()
+    return app.results
+
+
+def revision():
+    ''' returns the git commit being benchmarked, if known '''
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark building and ticking a Monster Cafe scene.')
+    parser.add_argument('--npcs', type=int, default=10)
+    parser.add_argument('--items', type=int, default=0)
+    parser.add_argument('--size', type=int, nargs=2, default=[800, 600],
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--ticks', type=int, default=300,
+                        help='calls timed of every per-tick function')
+    parser.add_argument('--queries', type=int, default=1000,
+                        help='collision checks timed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--headless', action='store_true',
+                        help='benchmark the simulation without kivy')
+    parser.add_argument('--offscreen', action='store_true',
+                        help='draw the window offscreen')
+    parser.add_argument('--batched', action='store_true',
+                        help='draw the NPCs and items with a sprite batch')
+    parser.add_argument('--output', default=None,
+                        help='file the results are appended to as a JSON '
+                             'line, instead of printing them')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.headless:
+        build_time, profiler, throughput = run_headless(args)
+    else:
+        build_time, profiler, throughput = run_app(args)
+
+    results = {'revision': revision(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'mode': 'headless' if args.headless else 'app',
+               'config': {'npcs': args.npcs, 'items': args.items,
+                          'size': args.size, 'ticks': args.ticks,
+                          'queries': args.queries, 'seed': args.seed,
+                          'batched': args.batched},
+               'build_ms': 1000 * build_time,
+               'collisions_per_s': throughput,
+               'sections': profiler.summary()['sections']}
+
+    line = json.dumps(results, sort_keys=True)
+    if args.output is None:
+        print (line)
+    else:
+        with open(args.output, 'a') as f:
+            f.write(line + '\n')
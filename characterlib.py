@@ -1,20 +1,20 @@
 import kivy
 kivy.require('1.10.1')
 
-from kivy.vector import Vector
 from kivy.properties import StringProperty
 
 from imagelib import LoopingImage, OverlappingImage
-from item import ItemBag
+from simulation import CharacterEntity, NonPlayerEntity, PlayerEntity
 
-# TODO  Check if we should separate the 'patrolling' aspect of the NPC
-#       to a separate class
 
 class Character(LoopingImage, OverlappingImage):
     ''' class handling images of characters in the game '''
-    STRETCH = 4
-    MOVEMENT_SPEED = 5
-    MOVE_INCREASE = 3
+    STRETCH = CharacterEntity.STRETCH
+    MOVEMENT_SPEED = CharacterEntity.MOVEMENT_SPEED
+    MOVE_INCREASE = CharacterEntity.MOVE_INCREASE
+    ENTITY = CharacterEntity
+    # every animation a character has
+    STATES = ('idle', 'run')
 
     image_state = StringProperty('')
 
@@ -23,34 +23,44 @@ class Character(LoopingImage, OverlappingImage):
         super().__init__(**kwargs)
 
 
+    def animation_state(self):
+        return self.image_state
+
+
+    def on_image_state(self, instance, value):
+        self._update_frames()
+
+
+    def on_image_num(self, instance, value):
+        ''' shows the frame, which the entity then collides with '''
+        super().on_image_num(instance, value)
+        if self.entity is not None and self._animated():
+            self.entity.sprite = self._sprite_file()
+
+
     def idle(self):
         self.image_state = "idle"
+        if self.entity is not None:
+            self.entity.idle()
 
 
-    def move(self,  offset): 
-        ''' move the character based on the movement speed and change
-        animation to the running animation 
-        
-        Keyword arguments:
-        offset  -- the amount of pixels that the character will move
+    def sync_from_entity(self):
+        ''' moves the character to where its entity is and shows its
+        animation
         '''
-        self.image_state = "run"
-        self.pos = (self.MOVEMENT_SPEED * Vector(offset)) + self.pos
+        super().sync_from_entity()
+        self.sync_state()
 
 
-    def sprint(self, offset):
-        ''' adjust movement based on the sprint-speed of the character
-        
-        Keyword arguments:
-        offset  -- the amount of pixels the character is initially moving
-        '''
-        new_offset = Vector(offset) * self.MOVE_INCREASE
-        return new_offset
+    def sync_state(self):
+        ''' shows the animation of the entity's state '''
+        self.image_state = self.entity.state
 
 
 class NonPlayerCharacterImage(Character):
     ''' class handling all non-player controlled characters' animation '''
-    HITBOX = 8
+    HITBOX = NonPlayerEntity.LEEWAY
+    ENTITY = NonPlayerEntity
 
     def __init__(self, name, movement_list=None, **kwargs):
         super().__init__(**kwargs)
@@ -60,54 +70,35 @@ class NonPlayerCharacterImage(Character):
         else:
             self.MOVEMENT_LIST = []
 
-        self._move_index = 1
-        # the amount of moves in a particular axis that the NPC expects
-        self._x, self._y = 0, 0
-    
-    
+
+    def create_entity(self):
+        return self.ENTITY(self.name, movement_list=self.MOVEMENT_LIST)
+
+
     def set_patrol(self, movement_list=None):
         ''' sets the places that the NPC is meant to move to
-        
+
         Keyword arguments:
         movement_list   --  a list of coordinates that the character will
                             move to in order of the elements
         '''
-        pass
+        self.MOVEMENT_LIST = movement_list if movement_list is not None else []
+        if self.entity is not None:
+            self.entity.set_patrol(self.MOVEMENT_LIST)
 
 
-    def update_movement(self):
-        ''' called by the main class, updating the current goal as well as
-        moving the NPC to said goal
+    def recycle(self, name, movement_list=None, **kwargs):
+        ''' turns a released NPC into another one, idle at the start of
+        its patrol
         '''
-        if len(self.MOVEMENT_LIST) > 0:
-            # if no more movements left, shift to the next set of coordinates
-            if self._x == 0 and self._y == 0:
-                self._x = self.MOVEMENT_LIST[self._move_index][0]
-                self._y = self.MOVEMENT_LIST[self._move_index][1]
-                self._move_index = ((self._move_index + 1) 
-                                    % len(self.MOVEMENT_LIST))
-            self._move_toward_goal()
-
-
-    def _move_toward_goal(self):
-        ''' moves the NPC to the current pair of desired coordinates '''
-        x_move, y_move = 0, 0
-
-        # if the remaining movement is positive, then the movement toward
-        # the respective axis is positive (right, up)
-        # if the remaining movement is negative, then the movement toward
-        # the respective axis is negative (left, down)
-        if self._x != 0:
-            x_move = self._x / abs(self._x)
-        if self._y != 0:
-            y_move = self._y / abs(self._y)
-
-        # we subtract from the amount of movement we have left
-        self._x -= x_move
-        self._y -= y_move
-
-        # then we move using the calculated movement
-        self.move(Vector(x_move, y_move))
+        self.name = name
+        if self.entity is not None:
+            self.entity.name = name
+            self.entity.idle()
+        self.set_patrol(movement_list)
+        self.image_num = 0
+        self.image_state = "idle"
+        super().recycle(**kwargs)
 
 
     def is_overlapping(self, widget):
@@ -123,13 +114,22 @@ class PlayerCharacter:
     ''' class handling the player-controlled characters '''
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.entity = PlayerEntity("skelet")
         self.image = Character(image_name = "skelet")
-        self.bag = ItemBag()
+        self.image.entity = self.entity
+
+
+    @property
+    def bag(self):
+        return self.entity.bag
 
 
     def add_item(self, item):
-        self.bag.add_item(item)
+        ''' puts an item in the bag by name, so that the widget it was
+        picked from is not kept
+        '''
+        self.bag.add_item(getattr(item, 'name', item))
 
 
     def open_inventory(self):
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,101 @@
+import collections
+
+
+ENTER = 'enter'
+STAY = 'stay'
+EXIT = 'exit'
+
+CollisionEvent = collections.namedtuple('CollisionEvent',
+                                        ['kind', 'entity', 'other'])
+
+
+class CollisionEvents(object):
+    ''' collects the overlaps found during a tick and turns them into
+    events once it ends, dispatched to every handler as a single batch: a
+    pair of entities found overlapping enters, stays while it is found
+    again on later ticks, and exits on the first tick its entity is
+    checked without finding the other; a pair found several times during
+    a tick gives a single event
+    '''
+
+    def __init__(self):
+        # the pairs overlapping as of the last flush, and those found
+        # during the current tick, in the order they were first found
+        self._touching = {}
+        self._found = {}
+        # the entities checked during the current tick
+        self._checked = set()
+        self._handlers = []
+        self.counts = collections.Counter()
+        self.batches = 0
+
+
+    def bind(self, handler):
+        ''' calls a handler with the list of events of every tick that
+        has any
+        '''
+        self._handlers.append(handler)
+
+
+    def unbind(self, handler):
+        self._handlers.remove(handler)
+
+
+    def report(self, entity, others):
+        ''' records the entities found overlapping an entity during the
+        current tick
+
+        Keyword arguments:
+        entity  -- the entity checked
+        others  -- every entity it overlaps
+        '''
+        self._checked.add(entity)
+        for other in others:
+            self._found[(entity, other)] = None
+
+
+    def touching(self, entity):
+        ''' returns the entities overlapping an entity as of the last
+        flush
+        '''
+        return [other for e, other in self._touching if e is entity]
+
+
+    def flush(self):
+        ''' turns the pairs found during the tick into events and
+        dispatches them, returning them
+        '''
+        events = []
+        for pair in self._found:
+            kind = STAY if pair in self._touching else ENTER
+            events.append(CollisionEvent(kind, *pair))
+        for pair in self._touching:
+            if pair in self._found:
+                continue
+            if pair[0] in self._checked:
+                events.append(CollisionEvent(EXIT, *pair))
+            else:
+                # not checked this tick, so still overlapping as far as
+                # is known
+                self._found[pair] = None
+
+        self._touching, self._found = self._found, {}
+        self._checked = set()
+        if events:
+            self.batches += 1
+            for e in events:
+                self.counts[e.kind] += 1
+            for handler in list(self._handlers):
+                handler(events)
+        return events
+
+
+    def clear(self):
+        ''' forgets every overlap, without any event '''
+        self._touching, self._found = {}, {}
+        self._checked = set()
+
+
+    def stats(self):
+        return {ENTER: self.counts[ENTER], STAY: self.counts[STAY],
+                EXIT: self.counts[EXIT], 'batches': self.batches}
@@ -0,0 +1,187 @@
+import numpy
+
+from spriteindex import SpriteIndex, index_key
+
+
+def mask_rows(opaque):
+    ''' returns the rows of a collision mask from the opacity of an image's
+    pixels, bottom row first, with the bit x of a row set if the pixel of
+    column x is colored
+
+    Keyword arguments:
+    opaque  -- a numpy array of booleans, a row of the image per row, top
+               row first
+    '''
+    packed = numpy.packbits(opaque[::-1], axis=1, bitorder='little')
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+class CollisionMask(object):
+    ''' the colored pixels of a sprite frame packed into an integer per
+    row, so that two sprites are checked for overlap a row at a time
+    '''
+
+    def __init__(self, rows, width, x0=0, y0=0):
+        ''' Keyword arguments:
+        rows    -- the rows of the mask, bottom first, bit x set if the
+                   pixel of column x is colored
+        width   -- the amount of columns of the mask
+        x0, y0  -- position of the bottom-left pixel of the mask relative
+                   to the entity it belongs to
+        '''
+        self.rows = tuple(rows)
+        self.width = width
+        self.x0, self.y0 = x0, y0
+        self.bounds = self._find_bounds()
+
+
+    @property
+    def height(self):
+        return len(self.rows)
+
+
+    def _find_bounds(self):
+        ''' returns the (left, bottom, right, top) of the colored pixels
+        relative to the entity, or None if none is colored
+        '''
+        colored = [y for y, row in enumerate(self.rows) if row]
+        if not colored:
+            return None
+        union = 0
+        for row in self.rows:
+            union |= row
+        left = (union & -union).bit_length() - 1
+        return (self.x0 + left, self.y0 + colored[0],
+                self.x0 + union.bit_length(), self.y0 + colored[-1] + 1)
+
+
+    def padding(self):
+        ''' returns the (left, right, top, bottom) transparent padding
+        around the colored pixels
+        '''
+        if self.bounds is None:
+            return (0, 0, 0, 0)
+        left, bottom, right, top = self.bounds
+        return (left - self.x0, self.x0 + self.width - right,
+                self.y0 + self.height - top, bottom - self.y0)
+
+
+    def scaled(self, stretch):
+        ''' returns the mask of the sprite stretched by an integer factor '''
+        if stretch == 1:
+            return self
+        rows = []
+        for row in self.rows:
+            scaled = 0
+            for x in range(self.width):
+                if row >> x & 1:
+                    scaled |= ((1 << stretch) - 1) << (x * stretch)
+            rows.extend([scaled] * stretch)
+        return CollisionMask(rows, self.width * stretch,
+                             self.x0 * stretch, self.y0 * stretch)
+
+
+    def dilated(self, leeway):
+        ''' returns the mask grown by the leeway in every direction, so
+        that masks closer than the leeway overlap
+        '''
+        if leeway == 0:
+            return self
+        # every row is first grown sideways, shifted so that no bit is lost
+        wide = []
+        for row in self.rows:
+            grown = row << leeway
+            for shift in range(1, leeway + 1):
+                grown |= row << (leeway + shift) | row << (leeway - shift)
+            wide.append(grown)
+
+        empty = [0] * leeway
+        padded = empty + wide + empty
+        rows = []
+        for y in range(len(self.rows) + 2 * leeway):
+            grown = 0
+            for row in padded[max(y - leeway, 0):y + leeway + 1]:
+                grown |= row
+            rows.append(grown)
+        return CollisionMask(rows, self.width + 2 * leeway,
+                             self.x0 - leeway, self.y0 - leeway)
+
+
+    def overlaps(self, x, y, other, other_x, other_y):
+        ''' checks if any colored pixel of the mask placed at (x, y) is
+        also colored in another mask placed at (other_x, other_y); the
+        bounds of their colored pixels are compared before any row
+        '''
+        if self.bounds is None or other.bounds is None:
+            return False
+        # the position of the other mask relative to this one
+        ox, oy = round(other_x) - round(x), round(other_y) - round(y)
+        left, bottom, right, top = self.bounds
+        o_left, o_bottom, o_right, o_top = other.bounds
+        if (o_left + ox >= right or o_right + ox <= left
+                or o_bottom + oy >= top or o_top + oy <= bottom):
+            return False
+
+        # only the rows where both masks have colored pixels are compared
+        dx = self.x0 - ox - other.x0
+        dy = self.y0 - oy - other.y0
+        start = max(bottom, o_bottom + oy) - self.y0
+        end = min(top, o_top + oy) - self.y0
+        rows, other_rows = self.rows, other.rows
+        if dx >= 0:
+            for k in range(start, end):
+                if rows[k] & (other_rows[k + dy] >> dx):
+                    return True
+        else:
+            for k in range(start, end):
+                if rows[k] & (other_rows[k + dy] << -dx):
+                    return True
+        return False
+
+
+class MaskCache(object):
+    ''' the collision masks of every sprite frame, built from the sprite
+    index once per stretch and leeway they are needed at
+    '''
+
+    def __init__(self, index=None):
+        self.index = index
+        self._masks = {}
+        # masks of sprites scanned at runtime, missing from the index
+        self._scanned = {}
+
+
+    def add(self, sprite, rows, width):
+        ''' adds the mask of a sprite that is not in the sprite index '''
+        self._scanned[index_key(sprite)] = CollisionMask(rows, width)
+
+
+    def _base(self, sprite):
+        if sprite in self._scanned:
+            return self._scanned[sprite]
+        index = self.index if self.index is not None else SpriteIndex.load()
+        rows = index.mask(sprite)
+        if rows is None:
+            return None
+        return CollisionMask(rows, index.size(sprite)[0])
+
+
+    def get(self, sprite, stretch=1, leeway=0):
+        ''' returns the mask of a sprite frame, or None if it is unknown
+
+        Keyword arguments:
+        sprite  -- the index key of the frame
+        stretch -- the factor the sprite is drawn stretched by
+        leeway  -- the pixels the mask is grown by on every side
+        '''
+        key = (sprite, stretch, leeway)
+        if key not in self._masks:
+            mask = self._base(sprite)
+            if mask is not None:
+                mask = mask.scaled(stretch).dilated(leeway)
+            self._masks[key] = mask
+        return self._masks[key]
+
+
+# the collision masks shared by the whole game
+MASKS = MaskCache()
@@ -0,0 +1,128 @@
+from collisionevents import ENTER, EXIT
+from simulation import ItemEntity, NonPlayerEntity
+
+
+class CafeControls(object):
+    ''' how the cafe reacts to the keys pressed, without any widget: the
+    player moves around while a movement key is held, at a step per tick
+    of the simulation, until a dialogue box is shown, which then has to
+    be dismissed before anything else; MonsterCafe shows what it decides,
+    and recorded input is replayed through it headless
+    '''
+    MOVEMENT_KEYS = ['left', 'right', 'up', 'down']
+    DIRECTIONS = {'left': (-1, 0), 'right': (1, 0),
+                  'up': (0, 1), 'down': (0, -1)}
+    DISMISS_KEY = 'enter'
+    INTERACT_KEY = 'e'
+
+    # what a key press did
+    MOVE = 'move'
+    TALK = 'talk'
+    DISMISS = 'dismiss'
+
+    # the kinds of dialogue boxes
+    ITEM = 'item'
+    SPEECH = 'speech'
+
+    def __init__(self, simulation=None):
+        self.simulation = None
+        # the kind of every dialogue box shown, the top one last
+        self.dialogues = []
+        # the movement keys held, the one pressed last moving the player
+        self.held = []
+        self.sprint = False
+        # the NPC the player can talk to
+        self.npc = None
+        # the order served by talking to the NPC last, if any
+        self.served = None
+        if simulation is not None:
+            self.attach(simulation)
+
+
+    def attach(self, simulation):
+        ''' controls the player of a simulation, following what it runs
+        into through the collision events of the simulation
+        '''
+        self.simulation = simulation
+        simulation.events.bind(self.on_collisions)
+
+
+    def on_collisions(self, events):
+        ''' shows an alert for every item the player picked up during a
+        tick; the NPC the player entered last can be talked to until the
+        player leaves it, and then any other NPC it still overlaps
+        '''
+        player = self.simulation.player
+        for e in events:
+            if e.entity is not player:
+                continue
+            if isinstance(e.other, ItemEntity) and e.kind == ENTER:
+                self.dialogues.append(self.ITEM)
+            elif isinstance(e.other, NonPlayerEntity):
+                if e.kind == ENTER:
+                    self.npc = e.other
+                elif e.kind == EXIT and e.other is self.npc:
+                    self.npc = next(
+                        (other for other in
+                         self.simulation.events.touching(player)
+                         if isinstance(other, NonPlayerEntity)), None)
+
+
+    def key_down(self, key, modifiers=None):
+        ''' handles a key press, returning TALK or DISMISS depending on
+        what it did, or None if it did nothing; movement keys are only
+        held, the player moving on the next tick
+
+        Keyword arguments:
+        key         -- the name of the key
+        modifiers   -- the names of the modifiers held, "shift" sprinting
+        '''
+        if key in self.MOVEMENT_KEYS:
+            # repeated presses of a held key only update the sprint
+            if key in self.held:
+                self.held.remove(key)
+            self.held.append(key)
+            self.sprint = modifiers is not None and "shift" in modifiers
+            return None
+
+        if self.dialogues:
+            if key == self.DISMISS_KEY:
+                self.dialogues.pop()
+                return self.DISMISS
+            return None
+        if key == self.INTERACT_KEY and self.npc is not None:
+            # talking to a customer serves its order, if the player holds
+            # every item of it
+            orders = self.simulation.orders
+            self.served = (orders.serve(self.npc, self.simulation.player.bag)
+                           if orders is not None else None)
+            self.dialogues.append(self.SPEECH)
+            return self.TALK
+        return None
+
+
+    def key_up(self, key):
+        ''' handles a key release, returning True if the player went idle;
+        letting go of the last movement key held shows the idle animation
+        unless an item alert is on top
+        '''
+        if key not in self.held:
+            return False
+        self.held.remove(key)
+        if (not self.held
+                and (not self.dialogues or self.dialogues[-1] != self.ITEM)):
+            self.simulation.player.idle()
+            return True
+        return False
+
+
+    def tick(self):
+        ''' moves the player a step toward the movement key pressed last,
+        unless a dialogue box is shown; returns MOVE if it moved, or None;
+        what it ran into is only known once the tick ends
+        '''
+        if not self.held or self.dialogues:
+            return None
+        self.simulation.move_player(self.DIRECTIONS[self.held[-1]],
+                                    self.sprint)
+        return self.MOVE
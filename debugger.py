@@ -1,3 +1,8 @@
+import collections
+import csv
+import functools
+import json
+import time
 
 
 class Debug(object):
@@ -9,3 +14,138 @@ class Debug(object):
             debugMsg += "-- " + msg
         print (debugMsg)
 
+
+class Profiler(Debug):
+    ''' opt-in recording of how long the hot paths of the game take, along
+    with counters such as texture loads and gauges such as widget counts
+    '''
+    # how many of the latest timings the percentiles are computed over
+    WINDOW = 600
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=None):
+        self.window = window if window is not None else self.WINDOW
+        self.enabled = False
+        self.reset()
+
+
+    def reset(self):
+        self.timings = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.window))
+        self.calls = collections.Counter()
+        self.totals = collections.Counter()
+        self.counters = collections.Counter()
+        self.gauges = {}
+
+
+    def enable(self):
+        self.enabled = True
+
+
+    def disable(self):
+        self.enabled = False
+
+
+    def record(self, name, seconds):
+        ''' adds a timing of a section of code '''
+        self.timings[name].append(seconds)
+        self.calls[name] += 1
+        self.totals[name] += seconds
+
+
+    def count(self, name, amount=1):
+        ''' increases a counter, such as the amount of texture loads '''
+        if self.enabled:
+            self.counters[name] += amount
+
+
+    def gauge(self, name, value):
+        ''' sets the latest value of a measure, such as a widget count '''
+        if self.enabled:
+            self.gauges[name] = value
+
+
+    def percentiles(self, name):
+        ''' returns the rolling percentiles of a section's timings, in
+        seconds, using the nearest-rank method
+        '''
+        ordered = sorted(self.timings[name])
+        if not ordered:
+            return dict((p, 0.0) for p in self.PERCENTILES)
+        return dict((p, ordered[min(len(ordered) - 1,
+                                    len(ordered) * p // 100)])
+                    for p in self.PERCENTILES)
+
+
+    def summary(self):
+        ''' returns every timing, counter and gauge recorded, with timings
+        in milliseconds
+        '''
+        sections = {}
+        for name in sorted(self.timings):
+            stats = {'calls': self.calls[name],
+                     'mean_ms': 1000 * self.totals[name] / self.calls[name],
+                     'max_ms': 1000 * max(self.timings[name])}
+            for p, value in self.percentiles(name).items():
+                stats['p' + str(p) + '_ms'] = 1000 * value
+            sections[name] = stats
+        return {'sections': sections,
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)}
+
+
+    def dump_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+    def dump_csv(self, filename):
+        ''' writes a row per section timed, followed by a row per counter
+        and gauge
+        '''
+        summary = self.summary()
+        columns = (['calls', 'mean_ms']
+                   + ['p' + str(p) + '_ms' for p in self.PERCENTILES]
+                   + ['max_ms'])
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name'] + columns)
+            for name, stats in summary['sections'].items():
+                writer.writerow([name] + [stats[c] for c in columns])
+            for kind in ('counters', 'gauges'):
+                for name, value in sorted(summary[kind].items()):
+                    writer.writerow([name, value])
+
+
+    def dump(self, basename):
+        ''' writes the summary to <basename>.json and <basename>.csv '''
+        try:
+            self.dump_json(basename + '.json')
+            self.dump_csv(basename + '.csv')
+        except OSError as e:
+            self.debugPrint(type(self).__name__, "dump", str(e))
+
+
+# the profiler shared by the whole game
+PROFILER = Profiler()
+
+
+def profiled(name):
+    ''' decorator timing every call of a function while the profiler is
+    enabled
+
+    Keyword arguments:
+    name    -- the name the timings are recorded under
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
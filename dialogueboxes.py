@@ -3,16 +3,21 @@ kivy.require('1.10.1')
 
 from kivy.uix.widget import Widget
 from kivy.uix.label import Label
-from kivy.graphics import RoundedRectangle, Color, Canvas
+from kivy.graphics import RoundedRectangle, Rectangle, Color, Canvas
+from kivy.metrics import sp
 
 from kivy.properties import StringProperty
 
+from textcache import TEXTS
+
 
 class DialogueBox(Widget):
     ''' base class of all dialogue boxes which appear on the screen '''
     text = StringProperty('')
 
     ALERT_FORMAT = ""
+    # the properties of the core label the text is rendered with
+    TEXT_STYLE = {'font_size': sp(15)}
 
     def __init__(self, **kwargs):
         ''' draws a transparent rounded rectangle at the top third of the
@@ -29,9 +34,10 @@ class DialogueBox(Widget):
         with self.canvas.before:
             Color(1, 1, 1, 0.3)
             RoundedRectangle(size=(self.w, self.h), pos=self.pos)
-        self.round_rect_label = Label(text=self.text, pos=self.pos,
-            size=(self.w, self.h))
-        self.add_widget(self.round_rect_label)
+        # the text is drawn from a cached texture, set once it is updated
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self._text_rect = Rectangle(pos=self.pos, size=(0, 0))
         self.bind(text=self.on_update_text)
 
 
@@ -40,13 +46,27 @@ class DialogueBox(Widget):
         self.text = new_text
 
 
+    def recycle(self, **kwargs):
+        ''' gives a released box new properties; its canvas is kept '''
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+
     def format_text(self, text):
         return text + "\n\nPress [ENTER] to close the window"
 
 
     def on_update_text(self, dt, value):
-        ''' callback when the text property has been updated '''
-        self.round_rect_label.text = self.format_text(self.text)
+        ''' callback when the text property has been updated; the text is
+        only rendered if no box has shown it before
+        '''
+        texture = TEXTS.render(self.format_text(self.text),
+                               **self.TEXT_STYLE)
+        self._text_rect.texture = texture
+        self._text_rect.size = texture.size
+        # centered in the box, as a label would draw it
+        self._text_rect.pos = (self.x + (self.w - texture.width) / 2,
+                               self.y + (self.h - texture.height) / 2)
 
 
 class ItemObtainedAlert(DialogueBox):
@@ -59,4 +79,54 @@ class ItemObtainedAlert(DialogueBox):
 class CharacterSpeechBox(DialogueBox):
     ''' class handling dialogue boxes of when characters speak '''
     def update_text(self, speaker, speech):
-        self.text = speaker + ": " + speech
\ No newline at end of file
+        self.text = speaker + ": " + speech
+
+
+class LoadingAlert(DialogueBox):
+    ''' class handling the dialogue box shown while the cafe loads '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.update_progress(0, 0)
+
+
+    def format_text(self, text):
+        return "Loading the cafe... " + text
+
+
+    def update_progress(self, loaded, total):
+        ''' shows how many of the images have been loaded '''
+        self.text = str(loaded) + "/" + str(total)
+
+
+class ProfilerOverlay(Widget):
+    ''' shows the rolling percentiles of the profiler's timings in the
+    bottom-left corner of the screen
+    '''
+    REFRESH_SPEED = 1.0
+
+    def __init__(self, profiler, **kwargs):
+        super().__init__(**kwargs)
+        self.profiler = profiler
+        self.size = 400, 160
+
+        with self.canvas.before:
+            Color(0, 0, 0, 0.5)
+            Rectangle(size=self.size, pos=self.pos)
+        self.label = Label(pos=self.pos, size=self.size, font_size=12,
+                           halign='left', valign='top',
+                           text_size=self.size)
+        self.add_widget(self.label)
+
+
+    def refresh(self, dt):
+        ''' rewrites the text with the latest percentiles '''
+        lines = ["section: p50 / p95 / p99 ms"]
+        for name in sorted(self.profiler.timings):
+            p = self.profiler.percentiles(name)
+            lines.append("{}: {:.2f} / {:.2f} / {:.2f}".format(
+                name, 1000 * p[50], 1000 * p[95], 1000 * p[99]))
+        for name, value in sorted(self.profiler.gauges.items()):
+            lines.append("{}: {}".format(name, value))
+        for name, value in sorted(self.profiler.counters.items()):
+            lines.append("{}: {}".format(name, value))
+        self.label.text = "\n".join(lines)
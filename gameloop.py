@@ -0,0 +1,61 @@
+class FixedStepLoop(object):
+    ''' runs the steps of a game at a fixed rate, however often frames
+    come: the time between frames is accumulated and spent a step at a
+    time, and what is left tells how far into the next step a frame is
+    drawn, so that it can be interpolated
+    '''
+    # the most steps run in a single frame; a frame further behind skips
+    # the rest, so that a slow machine slows the game down rather than
+    # falling further behind trying to catch up
+    MAX_STEPS = 5
+
+    def __init__(self, timestep, step, max_steps=None):
+        ''' Keyword arguments:
+        timestep    -- the seconds every step lasts
+        step        -- called to run a single step
+        max_steps   -- the most steps run in a single frame
+        '''
+        self.timestep = timestep
+        self.step = step
+        self.max_steps = max_steps if max_steps is not None else self.MAX_STEPS
+        self._accumulator = 0.0
+        self.steps = 0
+        self.frames = 0
+        self.skipped = 0
+
+
+    @property
+    def alpha(self):
+        ''' returns how far into the next step the last frame was, from 0
+        to 1
+        '''
+        return min(self._accumulator / self.timestep, 1.0)
+
+
+    def advance(self, dt):
+        ''' runs as many steps as fit in the time elapsed since the last
+        frame, returning how many were run
+
+        Keyword arguments:
+        dt  -- the seconds elapsed since the last frame
+        '''
+        self.frames += 1
+        self._accumulator += dt
+        steps = 0
+        while self._accumulator >= self.timestep:
+            if steps == self.max_steps:
+                # only a partial step is kept to interpolate through
+                skipped = int(self._accumulator // self.timestep)
+                self.skipped += skipped
+                self._accumulator -= skipped * self.timestep
+                break
+            self._accumulator -= self.timestep
+            self.step()
+            steps += 1
+        self.steps += steps
+        return steps
+
+
+    def stats(self):
+        return {'steps': self.steps, 'frames': self.frames,
+                'skipped': self.skipped}
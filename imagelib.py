@@ -2,19 +2,106 @@ import kivy
 kivy.require('1.10.1')
 
 from kivy.uix.image import Image
-from kivy.properties import NumericProperty, StringProperty
+from kivy.core.image import Image as CoreImage
+from kivy.atlas import Atlas
+from kivy.properties import (BooleanProperty, NumericProperty,
+                             StringProperty)
 from kivy.vector import Vector
 
+import json
 import math
+import os
+
+import numpy
+
+from collisionmask import MASKS, CollisionMask, mask_rows
+from debugger import Debug, PROFILER, profiled
+from simulation import Entity, hitboxes_overlap
+from spritecache import SPRITES, SpriteCache
+from spriteindex import SpriteIndex, index_key
+
+
+def find_mask(data):
+    ''' returns the rows of the collision mask of an image, bottom row
+    first, in a single pass over its alpha channel
+
+    Keyword arguments:
+    data    -- the kivy ImageData of the image, loaded with keep_data
+    '''
+    width, height = data.width, data.height
+    if data.fmt in ('rgb', 'bgr'):
+        # without an alpha channel every pixel is colored
+        return [(1 << width) - 1] * height
+
+    alpha_index = 0 if data.fmt in ('argb', 'abgr') else 3
+    alpha = numpy.frombuffer(data.data, dtype=numpy.uint8)[alpha_index::4]
+    # pixels of an alpha above half count as colored
+    opaque = alpha.reshape(height, width) > 127
+    if not data.flip_vertical:
+        # the rows of the data are already bottom first
+        opaque = opaque[::-1]
+    return mask_rows(opaque)
+
+
+ATLAS_FOLDER = os.path.join('Images', 'atlas')
+
+# atlases and animation frames loaded so far, shared by all instances
+_atlases = {}
+_atlas_frames = {}
+
+
+def atlas_file(name):
+    return os.path.join(ATLAS_FOLDER, name + '.atlas')
+
+
+def load_atlas(name):
+    ''' returns the atlas packed by atlaspacker.py, or None if it has not
+    been packed
+    '''
+    if name not in _atlases:
+        filename = atlas_file(name)
+        _atlases[name] = Atlas(filename) if os.path.exists(filename) else None
+    return _atlases[name]
+
+
+def atlas_pages(name):
+    ''' returns the image files of every page of a packed atlas, named as
+    the atlas loads them, or an empty list if it has not been packed
+    '''
+    filename = atlas_file(name)
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return [os.path.join(ATLAS_FOLDER, page) for page in json.load(f)]
+
+
+def atlas_names(name):
+    ''' returns the name of every region of a packed atlas, without
+    loading its pages, or an empty set if it has not been packed
+    '''
+    filename = atlas_file(name)
+    if not os.path.exists(filename):
+        return set()
+    with open(filename) as f:
+        return set(region for page in json.load(f).values()
+                   for region in page)
+
+
+def atlas_frames(image_name, image_state):
+    ''' returns the textures of every frame of a character animation, in
+    order, as regions of the character atlas
+    '''
+    key = (image_name, image_state)
+    if key not in _atlas_frames:
+        textures = load_atlas('chars').textures
+        frame_name = image_name + '_' + image_state + '_anim_f'
+        frames = []
+        while frame_name + str(len(frames)) in textures:
+            frames.append(textures[frame_name + str(len(frames))])
+        _atlas_frames[key] = frames
+    return _atlas_frames[key]
 
-from debugger import Debug
 
-# TODO  When searching for the colored pixel, use binary search algo for 
-#       optimization
-#
-# TODO  Possibly make an all-around function encapsulating the search for
-#       the non-transparent pixel beginning
-#
 # TODO  Increase hit-box for collision when interacting with characters vs
 #       interacting with objects
 
@@ -22,134 +109,207 @@ from debugger import Debug
 class OverlappingImage(Image):
     ''' Class handling images that can sense if another image is 
     overlapping it, doing so by calculating the transparency around
-    each image
+    each image and comparing the collision masks of their frames; once
+    built, the image renders the state of an entity of the simulation
     '''
 
     STRETCH = 1
-    
+    ENTITY = Entity
+
+    # paddings of every source file scanned so far, shared by all instances
+    _padding_cache = {}
+
     def __init__(self, **kwargs):
+        # the simulation entity the image renders, created on build
+        self.entity = None
         super().__init__(**kwargs)
-        self._stretch = self.STRETCH + 1
+        self._stretch = self.STRETCH
 
 
     def _init_transparency(self):
         ''' initializes approximates of transparent padding around image,
         accomodating for stretch 
         '''
-        self.left_pad = self._find_left_pixel() * self._stretch
-        self.right_pad = self._find_right_pixel() * self._stretch
-        self.top_pad = self._find_top_pixel() * self._stretch
-
-
-    def _find_left_pixel(self):
-        ''' locate first colored pixel on image's left '''
-        true_left = self._coreimage.width
-        for y in range(self._coreimage.height):
-            for x in range(self._coreimage.width):
-                if (self._coreimage.read_pixel(x, y)[-1] > 0.5
-                        and x < true_left):
-                    true_left = x
-                    continue
-        return true_left
-
-
-    def _find_right_pixel(self):
-        ''' locate first colored pixel on image's right '''
-        true_right = -1
-        for y in range(self._coreimage.height):
-            for x in range(self._coreimage.width - 1, -1, -1):
-                if (self._coreimage.read_pixel(x, y)[-1] > 0.5
-                        and x > true_right):
-                    true_right = x
-                    continue
-                # we no longer iterate if we are within the image
-                elif (self._coreimage.read_pixel(x, y)[-1] > 0.5
-                        and x <= true_right):
-                    break
-        return self._coreimage.width - true_right
-
- 
-    def _find_top_pixel(self):
-        ''' locate first colored pixel on image's top '''
-        true_top = -1
-        for x in range(self._coreimage.width):
-            for y in range(self._coreimage.height - 1, -1, -1):
-                if (self._coreimage.read_pixel(x, y)[-1] > 0.5
-                        and y > true_top):
-                    true_top = y
-                    continue
-                # we no longer iterate if we are within the image
-                elif (self._coreimage.read_pixel(x, y)[-1] > 0.5
-                        and y <= true_top):
-                    break
-        return self._coreimage.height - true_top
-
-
-    def _in_widget_horizontal(self, widget, leeway):
-        ''' returns true or false if within a widget's x-axis 
-        
-        Keyword arguments:
-        widget  -- the widget to compare to
-        '''
-        widget_left = widget.x + widget.left_pad - leeway
-        widget_right = widget.right - widget.right_pad + leeway
-        self_left = self.x + self.left_pad - leeway
-        self_right = self.right - self.right_pad + leeway
+        left, right, top, bottom = self._find_padding()
+        self.left_pad = left * self._stretch
+        self.right_pad = right * self._stretch
+        self.top_pad = top * self._stretch
+        self.bottom_pad = bottom * self._stretch
 
-        overlapping_right = widget_left <= self_left < widget_right
-        overlapping_left = widget_left <= self_right < widget_right
-        overlapping_on = (self_right > widget_right 
-                             and self_left < widget_left)
-                             
-        return (overlapping_right or overlapping_left or overlapping_on)
 
+    def _sprite_file(self):
+        ''' returns the file the current texture was loaded from '''
+        return self._coreimage.filename
 
-    def _in_widget_vertical(self, widget, leeway):
-        ''' returns true or false if within a widget's y-axis 
 
-        Keyword arguments:
-        widget  -- the widget to compare to
+    def _find_padding(self):
+        ''' returns the padding of the image's source file, taken from the
+        sprite index or else scanning its pixels the first time the file
+        is seen
         '''
-        widget_y = widget.y - leeway
-        widget_top = widget.top - widget.top_pad + leeway
-        self_y = self.y - leeway
-        self_top = self.top - self.top_pad + leeway
+        key = self._sprite_file()
+        if key not in self._padding_cache:
+            padding = SpriteIndex.load().padding(key)
+            if padding is None:
+                # the pixels are only kept for as long as they are scanned
+                image = CoreImage(key, keep_data=True, nocache=True)
+                rows = find_mask(image.image._data[0])
+                MASKS.add(key, rows, image.width)
+                padding = CollisionMask(rows, image.width).padding()
+            self._padding_cache[key] = padding
+        return self._padding_cache[key]
+
+
+    def hitbox(self, leeway=0):
+        ''' returns the (left, bottom, right, top) of the colored part of
+        the image, grown by the leeway on every side
+        '''
+        return (self.x + self.left_pad - leeway,
+                self.y + self.bottom_pad - leeway,
+                self.right - self.right_pad + leeway,
+                self.top - self.top_pad + leeway)
+
 
-        overlapping_above = widget_y <= self_y < widget_top
-        overlapping_below = widget_y <= self_top < widget_top
-        overlapping_on = (self_y < widget_y and self_top > widget_top)
+    def create_entity(self):
+        return self.ENTITY()
 
-        return (overlapping_above or overlapping_below or overlapping_on)
 
+    def texture_update(self, *largs):
+        PROFILER.count('texture_loads')
+        super().texture_update(*largs)
 
+
+    @profiled('OverlappingImage.build')
     def build(self):
         self._init_transparency()
-        self.width = self._coreimage.width * self.STRETCH
-        self.height = self._coreimage.height * self.STRETCH
+        self.width = self.texture_size[0] * self.STRETCH
+        self.height = self.texture_size[1] * self.STRETCH
+
+        if self.entity is None:
+            self.entity = self.create_entity()
+        self.entity.sprite = index_key(self._sprite_file())
+        self.entity.set_sprite(self.width, self.height,
+                               (self.left_pad, self.right_pad,
+                                self.top_pad, self.bottom_pad))
+        self.entity.x, self.entity.y = self.pos
+
+
+    def recycle(self, **kwargs):
+        ''' gives a released image new properties; its entity is kept, and
+        is sized after the new sprite on build
+        '''
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+
+    def sync_from_entity(self):
+        ''' moves the image to where its entity is '''
+        self.pos = self.entity.pos
 
     
     def is_overlapping(self, widget, leeway=0):
-        ''' checks if it's overlapping another widget's "hitbox"
+        ''' checks if it's overlapping another widget's "hitbox", and the
+        collision masks of both once they are built
         
         Keyword arguments:
         widget  -- the widget to compare to
         '''
-        if (self._in_widget_horizontal(widget, leeway) 
-                and self._in_widget_vertical(widget, leeway)):
-            return True
+        entity = getattr(widget, 'entity', None)
+        if self.entity is not None and entity is not None:
+            return self.entity.is_overlapping(entity, leeway)
+        return hitboxes_overlap(self.hitbox(leeway), widget.hitbox(leeway))
 
 
 class LoopingImage(Image):
-    ''' Class of animations composed by looping images '''
+    ''' Class of animations composed by looping images; when the character
+    atlas has been packed, frames are swapped as regions of the atlas
+    texture, otherwise they are taken from the shared sprite cache
+    '''
     CYCLE_LENGTH = 4
+    SHEET_FOLDER = 'Images/chars/'
+
+    # paused images are skipped by MonsterCafe.update_image
+    paused = False
 
     image_name = StringProperty('')
     image_num = NumericProperty(0)
+    use_atlas = BooleanProperty(os.path.exists(atlas_file('chars')))
+
+    def __init__(self, **kwargs):
+        self._frames = []
+        super().__init__(**kwargs)
+        self._update_frames()
+
+
+    def animation_state(self):
+        return 'idle'
+
+
+    def _animated(self):
+        ''' checks if the image has been given an animation to show '''
+        return bool(self.image_name and self.animation_state())
+
+
+    @classmethod
+    def frame_key(cls, image_name, image_state, image_num):
+        ''' returns the (sheet, frame) of a frame in the sprite cache '''
+        return (cls.SHEET_FOLDER + image_name,
+                '{}_{}_anim_f{}'.format(image_name, image_state, image_num))
+
+
+    @classmethod
+    def frame_keys(cls, image_name, image_state):
+        ''' returns the (sheet, frame) of every frame of an animation '''
+        length = SpriteIndex.load().cycle_length(image_name, image_state,
+                                                 cls.CYCLE_LENGTH)
+        return [cls.frame_key(image_name, image_state, i)
+                for i in range(length)]
+
+
+    def _sprite_file(self):
+        return SpriteCache.sprite_file(*self.frame_key(
+            self.image_name, self.animation_state(), self.image_num))
+
+
+    def _update_frames(self, *args):
+        ''' fetches the atlas frames of the current animation '''
+        if not self._animated():
+            return
+        if self.use_atlas:
+            self._frames = atlas_frames(self.image_name,
+                                        self.animation_state())
+        self.on_image_num(self, self.image_num)
+
+
+    def on_image_name(self, instance, value):
+        self._update_frames()
+
+
+    def on_use_atlas(self, instance, value):
+        self._update_frames()
+
+
+    def on_image_num(self, instance, value):
+        if not self._animated():
+            return
+        if not self.use_atlas:
+            self.texture = SPRITES.texture(*self.frame_key(
+                self.image_name, self.animation_state(),
+                int(value) % self.cycle_length()))
+        elif self._frames:
+            self.texture = self._frames[int(value) % len(self._frames)]
+            PROFILER.count('atlas_frame_swaps')
+
+
+    def cycle_length(self):
+        ''' returns the amount of frames in the current animation '''
+        return SpriteIndex.load().cycle_length(
+            self.image_name, self.animation_state(), self.CYCLE_LENGTH)
 
 
     def update_image(self):
         ''' moves image to next image state via number suffixes of the file '''
-        self.image_num = (self.image_num + 1) % self.CYCLE_LENGTH
+        self.image_num = (self.image_num + 1) % self.cycle_length()
 
 
 class FloatingImage(Image):
@@ -161,6 +321,9 @@ class FloatingImage(Image):
     UP = 1
     DOWN = -1
 
+    # paused images are skipped by MonsterCafe.update_image
+    paused = False
+
     item_name = StringProperty('')
 
     def __init__(self, **kwargs):
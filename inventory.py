@@ -0,0 +1,155 @@
+import collections
+import collections.abc
+
+
+# what the bag holds of an item, instead of the widget it was picked from
+ItemRecord = collections.namedtuple('ItemRecord', ['name', 'count'])
+
+
+def _as_counts(items):
+    ''' returns the count of every item name in a mapping of names to
+    counts, or in an iterable of names each counted once; raises a
+    ValueError if any count is not positive
+    '''
+    if not isinstance(items, collections.abc.Mapping):
+        return collections.Counter(items)
+    counts = dict(items)
+    for name, count in counts.items():
+        _check_count(name, count)
+    return counts
+
+
+def _check_count(item_name, count):
+    if count <= 0:
+        raise ValueError("not a positive count of " + str(item_name)
+                         + ": " + str(count))
+
+
+class ItemBag(object):
+    ''' the items carried by a character, stacked by name so that adding,
+    removing or looking up an item takes the same time however many the
+    bag holds
+    '''
+
+    def __init__(self, items=()):
+        ''' Keyword arguments:
+        items   -- names of items, or a mapping of names to counts, the bag
+                   starts with
+        '''
+        # the count of every item name, in the order they were first added
+        self._counts = {}
+        self._total = 0
+        self.add_items(items)
+
+
+    def __len__(self):
+        ''' returns the amount of items, counting every item of a stack '''
+        return self._total
+
+
+    def __contains__(self, item_name):
+        return item_name in self._counts
+
+
+    def __iter__(self):
+        ''' iterates over the ItemRecord of every stack '''
+        for name, count in self._counts.items():
+            yield ItemRecord(name, count)
+
+
+    @property
+    def items(self):
+        ''' returns the name of every item, repeated as many times as it is
+        stacked
+        '''
+        return [name for name, count in self._counts.items()
+                for i in range(count)]
+
+
+    def names(self):
+        ''' returns the name of every stack '''
+        return list(self._counts)
+
+
+    def count(self, item_name):
+        return self._counts.get(item_name, 0)
+
+
+    def add_item(self, item_name, count=1):
+        ''' adds items to a stack, starting it if the bag holds none of
+        them; raises a ValueError if the count is not positive
+        '''
+        _check_count(item_name, count)
+        self._counts[item_name] = self._counts.get(item_name, 0) + count
+        self._total += count
+
+
+    def delete_item(self, item_name, count=1):
+        ''' removes items from a stack, returning False and removing none
+        if there are not enough of them; raises a ValueError if the count
+        is not positive
+        '''
+        _check_count(item_name, count)
+        if not self.has_item(item_name, count):
+            return False
+        left = self._counts[item_name] - count
+        if left:
+            self._counts[item_name] = left
+        else:
+            del self._counts[item_name]
+        self._total -= count
+        return True
+
+
+    def has_item(self, item_name, count=1):
+        return self._counts.get(item_name, 0) >= count
+
+
+    def add_items(self, items):
+        ''' adds names of items, or a mapping of names to counts '''
+        for name, count in _as_counts(items).items():
+            self.add_item(name, count)
+
+
+    def has_items(self, items):
+        ''' checks if the bag holds every item of a recipe or an order
+
+        Keyword arguments:
+        items   -- names of items, or a mapping of names to counts
+        '''
+        return all(self.has_item(name, count)
+                   for name, count in _as_counts(items).items())
+
+
+    def missing_items(self, items):
+        ''' returns the count of every item of a recipe or an order the bag
+        does not hold enough of
+        '''
+        missing = {}
+        for name, count in _as_counts(items).items():
+            if count > self.count(name):
+                missing[name] = count - self.count(name)
+        return missing
+
+
+    def take_items(self, items):
+        ''' removes every item of a recipe or an order, returning False and
+        removing none if any is missing; raises a ValueError if any count
+        is not positive
+        '''
+        counts = _as_counts(items)
+        if not self.has_items(counts):
+            return False
+        for name, count in counts.items():
+            self.delete_item(name, count)
+        return True
+
+
+    def clear(self):
+        self._counts.clear()
+        self._total = 0
+
+
+    def print_items(self):
+        for record in self:
+            print (record.name + " x" + str(record.count))
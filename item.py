@@ -12,11 +12,16 @@ from kivy.clock import Clock
 
 import random
 
-from imagelib import OverlappingImage, FloatingImage
+from imagelib import OverlappingImage, FloatingImage, load_atlas
+from inventory import ItemBag
+from simulation import ItemEntity
+from spritecache import SPRITES, SpriteCache
 
 class Item(OverlappingImage, FloatingImage):
     ''' widgets "collectable" by player class '''
-    STRETCH = 2
+    STRETCH = ItemEntity.STRETCH
+    ENTITY = ItemEntity
+    SHEET = 'Images/food'
 
     item_name = StringProperty('')
 
@@ -25,26 +30,30 @@ class Item(OverlappingImage, FloatingImage):
         self.name = referred_name
 
 
-class ItemBag(object):
-    ''' container for Item class; use to be expanded later '''
-    def __init__(self):
-        self.items = []
+    def on_item_name(self, instance, value):
+        ''' shows the food, as a region of the food atlas when it has
+        been packed
+        '''
+        atlas = load_atlas('food')
+        if atlas is not None and value in atlas.textures:
+            self.texture = atlas[value]
+        else:
+            self.texture = SPRITES.texture(self.SHEET, value)
 
 
-    def add_item(self, item_name):
-        self.items.append(item_name)
+    def _sprite_file(self):
+        return SpriteCache.sprite_file(self.SHEET, self.item_name)
 
 
-    def delete_item(self, item_name):
-        if self.has_item(item_name):
-            return True
-        return False
+    def create_entity(self):
+        return self.ENTITY(self.name)
 
-    
-    def has_item(self, item_name):
-        return (item_name in self.items)
 
-
-    def print_items(self):
-        for i in self.items:
-            print (i)
\ No newline at end of file
+    def recycle(self, referred_name, **kwargs):
+        ''' turns a released item into another one, floating anew '''
+        self.name = referred_name
+        if self.entity is not None:
+            self.entity.name = referred_name
+        self.image_num = 0
+        self.movement_direction = self.UP
+        super().recycle(**kwargs)
@@ -8,8 +8,8 @@ from kivy.app import App
 from kivy.core.window import Window
 
 from kivy.uix.widget import Widget
-from kivy.uix.image import Image
-from kivy.uix.gridlayout import GridLayout
+from kivy.graphics import (Color, InstructionGroup, PopMatrix,
+                           PushMatrix, Rectangle, Translate)
 
 from kivy.properties import (NumericProperty, ObjectProperty, 
                              StringProperty)
@@ -18,50 +18,175 @@ from kivy.clock import Clock
 from kivy.event import *
 
 import math
+import os
 import random
 from functools import partial
 
-from characterlib import PlayerCharacter, NonPlayerCharacterImage
-from dialogueboxes import (DialogueBox, ItemObtainedAlert, 
-                           CharacterSpeechBox)
+from behaviours import cafe_ai
+from characterlib import Character, PlayerCharacter, NonPlayerCharacterImage
+from collisionevents import ENTER, STAY
+from controls import CafeControls
+from debugger import PROFILER, profiled
+from dialogueboxes import (ItemObtainedAlert, CharacterSpeechBox,
+                           LoadingAlert, ProfilerOverlay)
+from gameloop import FixedStepLoop
+from imagelib import (FloatingImage, LoopingImage,
+                      atlas_names, atlas_pages, load_atlas)
 from item import Item
+from orders import CafeOrders
+from preloader import AssetPreloader
+from replay import (InputRecorder, LogHeader, plan_cafe, random_spot,
+                    state_digest)
+from scene import ChunkStreamer, SceneFile, camera_at
+from simulation import ItemEntity, NonPlayerEntity, Simulation
+from spritebatch import SpriteBatch
+from spritecache import SPRITES
+from textcache import TEXTS
+from widgetpool import POOLS
 
-# TODO  Changing Window size messes up gridlayout for floor
-#
-# TODO  Consider whether to make the Floor class into one function
-#
 # TODO  Consider to create a tileset rather than dynamically generating it
 #
 # TODO  Adjust how sprinting works
 
 
-class Floor(GridLayout):
-    ''' class handling dynamically generated floor-tiles '''
+class Floor(Widget):
+    ''' class handling randomly generated floor-tiles, drawn as instructions
+    on a single canvas rather than as a widget per tile; the floor of a
+    scene is drawn instead a chunk at a time, as chunks are streamed in
+    '''
     TILE_SIZE = 32
+    TILE_KINDS = 8
+    SHEET = 'Images/bg'
 
-    def build(self):
-        ''' creates floor based on the window size using randomized 
-        tiles 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seed = 0
+        self._textures = []
+        # the tiles generated so far and the generator of each row, so the
+        # same seed always gives the same floor regardless of resizing
+        self._tile_rows = []
+        self._row_generators = []
+        # the texture of every tile of a scene, and the instructions
+        # drawing every chunk shown
+        self._tileset = {}
+        self._chunks = {}
+
+
+    def build(self, seed=None):
+        ''' creates floor that covers the widget using randomized tiles,
+        redrawing it whenever the widget is resized
+
+        Keyword arguments:
+        seed    -- seed of the tile map; a random one is picked if None
+        '''
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self._tile_rows = []
+        self._row_generators = []
+        self._textures = self._load_textures()
+        self.bind(pos=self._draw, size=self._draw)
+        self._draw()
+
+
+    def _load_textures(self):
+        ''' returns the texture of every kind of tile, taken from the floor
+        atlas when it has been packed
+        '''
+        atlas = load_atlas('floor')
+        return [self._texture(atlas, "floor_" + str(i))
+                for i in range(1, self.TILE_KINDS + 1)]
+
+
+    def _texture(self, atlas, frame):
+        if atlas is not None and frame in atlas.textures:
+            return atlas[frame]
+        return SPRITES.texture(self.SHEET, frame)
+
+
+    def build_scene(self, tileset):
+        ''' readies the floor to show the chunks of a scene
+
+        Keyword arguments:
+        tileset -- the sprite of every tile character
         '''
-        s = Window.size
-        self.cols = math.ceil(s[0]/self.TILE_SIZE)
-        self.rows = math.ceil(s[1]/self.TILE_SIZE)
+        atlas = load_atlas('floor')
+        self._tileset = {tile: self._texture(atlas, frame)
+                         for tile, frame in tileset.items()}
+        self._chunks = {}
+        self.canvas.clear()
 
-        for i in range(self.cols * self.rows):
-            i = Image(source="Images\\bg\\floor_" 
-                        + str(random.randint(1,8)) + ".png")
-            i.allow_stretch = True
-            self.add_widget(i)
+
+    def show_chunk(self, key, origin, layers):
+        ''' draws the tile layers of a chunk, in the coordinates of the
+        scene
+
+        Keyword arguments:
+        key     -- the (col, row) of the chunk
+        origin  -- the bottom-left of the chunk, in pixels
+        layers  -- the tile layers of the chunk, bottom row first
+        '''
+        size = (self.TILE_SIZE, self.TILE_SIZE)
+        group = InstructionGroup()
+        group.add(Color(1, 1, 1, 1))
+        for rows in layers.values():
+            for row, line in enumerate(rows):
+                y = origin[1] + row * self.TILE_SIZE
+                for col, tile in enumerate(line):
+                    texture = self._tileset.get(tile)
+                    if texture is not None:
+                        group.add(Rectangle(
+                            texture=texture, size=size,
+                            pos=(origin[0] + col * self.TILE_SIZE, y)))
+        self._chunks[key] = group
+        self.canvas.add(group)
+
+
+    def hide_chunk(self, key):
+        self.canvas.remove(self._chunks.pop(key))
+
+
+    def tile_at(self, col, row):
+        ''' returns the index of the texture used by a tile '''
+        while len(self._tile_rows) <= row:
+            self._row_generators.append(
+                random.Random(self.seed * 100003 + len(self._tile_rows)))
+            self._tile_rows.append([])
+
+        tiles = self._tile_rows[row]
+        while len(tiles) <= col:
+            tiles.append(self._row_generators[row].randrange(self.TILE_KINDS))
+        return tiles[col]
+
+
+    def _draw(self, *args):
+        ''' redraws every tile needed to cover the widget '''
+        cols = math.ceil(self.width / self.TILE_SIZE)
+        rows = math.ceil(self.height / self.TILE_SIZE)
+        size = (self.TILE_SIZE, self.TILE_SIZE)
+
+        self.canvas.clear()
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            for row in range(rows):
+                # the first row is drawn on top, as the grid layout did
+                y = self.top - (row + 1) * self.TILE_SIZE
+                for col in range(cols):
+                    Rectangle(texture=self._textures[self.tile_at(col, row)],
+                              pos=(self.x + col * self.TILE_SIZE, y),
+                              size=size)
 
 
 class MonsterCafe(Widget):
     storeFloor = ObjectProperty(None)
 
-    MOVEMENT_KEYS = ['left', 'right', 'up', 'down']
-    DISMISS_KEY = 'enter'
-    INTERACT_KEY = 'e'
+    # idle characters only change frames every this many image updates
+    IDLE_FRAME_SKIP = 2
+    # the images are updated every this many ticks of the simulation
+    IMAGE_TICKS = 2
 
     def __init__(self, **kwargs):
+        # the children with an animation, updated on every image update
+        self._animated = {}
+        self._image_tick = 0
         super().__init__(**kwargs)
 
         self._keyboard = Window.request_keyboard(
@@ -72,9 +197,41 @@ class MonsterCafe(Widget):
         self._keyboard.bind(on_key_up=self._on_keyboard_up)
 
         self.player = PlayerCharacter()
-        self.item_alert = ItemObtainedAlert()
-        self.speech_box = CharacterSpeechBox()
-        self.interact_function = ""
+        # the dialogue boxes last shown, taken from the widget pools
+        self.item_alert = None
+        self.speech_box = None
+        self._speaker = None
+        # the dialogue boxes shown, the top one last
+        self._dialogues = []
+        self.seed = None
+        self.rng = random.Random()
+        self._planned_npcs = []
+        self._planned_foods = []
+        # the scene the cafe is filled with instead, and the streamer
+        # loading its chunks
+        self.scene = None
+        self.streamer = None
+        self.simulation = None
+        self.controls = CafeControls()
+        # writes the input received to a log, when recording
+        self.recorder = None
+        # the widget rendering each entity of the simulation
+        self._widgets = {}
+        # when batched, draws the NPCs and items in place of their
+        # widgets, which are then left out of the window
+        self.batched = False
+        self.sprites = None
+        self.loop = FixedStepLoop(Simulation.TIMESTEP, self.tick)
+        # the widgets moving during the current tick, from and to where
+        self._motion = {}
+        # the bottom-left of the part of the cafe shown, as of the last
+        # tick, and the translation drawing it
+        self.camera = (0, 0)
+        with self.canvas.before:
+            PushMatrix()
+            self._camera = Translate(0, 0)
+        with self.canvas.after:
+            PopMatrix()
 
         self.register_event_type("on_item_obtained")
 
@@ -84,70 +241,56 @@ class MonsterCafe(Widget):
         self._keyboard = None
 
 
+    @profiled('MonsterCafe._on_keyboard_down')
     def _on_keyboard_down(self, keyboard, keycode, text, modifiers):
-        if isinstance(self.children[0], DialogueBox):
-            if keycode[1] == self.DISMISS_KEY:
-                self.remove_widget(self.children[0])
-        else:
-            if keycode[1] in self.MOVEMENT_KEYS:
-                self._handle_move_key(keycode[1], modifiers)
-            if (keycode[1] == self.INTERACT_KEY
-                    and self.interact_function != ""):
-                self.interact_function()
+        ''' shows what the controls did with a key press '''
+        # keys pressed while loading are ignored
+        if self.simulation is None:
+            return True
+        if self.recorder is not None:
+            self.recorder.key_down(self.simulation.tick, keycode[1],
+                                   modifiers)
+
+        action = self.controls.key_down(keycode[1], modifiers)
+        if action == CafeControls.DISMISS:
+            POOLS.release(self._dialogues.pop())
+        elif action == CafeControls.TALK:
+            self.show_text_box()
         return True
 
 
     def _on_keyboard_up(self, keyboard, keycode):
+        if self.simulation is None:
+            return
+        if self.recorder is not None:
+            self.recorder.key_up(self.simulation.tick, keycode[1])
         # if the player lets go of a movement, the animation goes to the
         # idle animation
-        if (keycode[1] in self.MOVEMENT_KEYS 
-                and not isinstance(self.children[0], ItemObtainedAlert)):
-            self.player.image.idle()       
-
-
-    def _handle_move_key(self, key, modifiers=None):
-        up = (self.player.image.top - self.player.image.top_pad 
-              + self.player.image.MOVEMENT_SPEED)
-        down = self.player.image.y - self.player.image.MOVEMENT_SPEED 
-        left = (self.player.image.x + self.player.image.left_pad 
-                - self.player.image.MOVEMENT_SPEED)
-        right = (self.player.image.right - self.player.image.right_pad
-                 + self.player.image.MOVEMENT_SPEED)
-
-        if key == "down" and down >= 0:
-            move = (0, -1)
-        elif key == "up" and up <= self.height:
-            move = (0, 1)
-        elif key == "left" and left >= 0:
-            move = (-1, 0)
-        elif key == "right" and right <= self.width:
-            move = (1, 0)
-        else:
-            move = (0, 0)
+        if self.controls.key_up(keycode[1]):
+            self.player.image.idle()
 
-        if modifiers is not None:
-            if "shift" in modifiers:
-                move = self.player.image.sprint(move)
-        
-        self.player.image.move(move)
-        self._on_collision(move)
-
-
-    def _on_collision(self, move):
-        ''' checks if there is collision between the player widget and
-        any other widget
-        '''
-        for w in self.children:
-            if isinstance(w, Item):
-                if self.player.image.is_overlapping(w):
-                    self.dispatch('on_item_obtained', w)
-            if isinstance(w, NonPlayerCharacterImage):
-                if w.is_overlapping(self.player.image):
-                    self.update_text_box(w)
-                    self.interact_function = self.show_text_box
-                    break
+
+    @profiled('MonsterCafe._on_collisions')
+    def _on_collisions(self, events):
+        ''' handles the collision events of a tick, after the controls
+        did: items the player entered were picked up, and the NPC to talk
+        to changes as the player enters and leaves NPCs
+        '''
+        player = self.simulation.player
+        npc_changed = False
+        for e in events:
+            if e.entity is not player or e.kind == STAY:
+                continue
+            if isinstance(e.other, ItemEntity):
+                if e.kind == ENTER:
+                    self.dispatch('on_item_obtained',
+                                  self._widgets.pop(e.other))
             else:
-                self.interact_function = ""
+                npc_changed = True
+
+        npc = self.controls.npc
+        if npc_changed and npc is not None:
+            self.update_text_box(self._widgets[npc])
 
 
     def on_item_obtained(self, w):
@@ -155,21 +298,44 @@ class MonsterCafe(Widget):
 
 
     def on_item_obtained_cb(self, dt, w):
-        ''' callback when an item has been obtained by the player '''
-        self.player.add_item(w)
-        self.remove_widget(w)
-        self.add_widget(self.item_alert)
+        ''' callback when an item has been obtained by the player; the
+        simulation already put it in the player's bag, and the widget goes
+        back to its pool
+        '''
+        self._release_sprite(w)
+        self.item_alert = POOLS.acquire(ItemObtainedAlert)
         self.item_alert.update_text(w.name)
+        self._show_dialogue(self.item_alert)
 
     
     def update_text_box(self, w):
-        ''' updates text of the dialogue box '''
-        self.speech_box.update_text(w.name, "Hey there!")
+        ''' sets who speaks in the next dialogue box '''
+        self._speaker = w.name
 
 
     def show_text_box(self):
-        ''' displays dialogue of character on screen '''
-        self.add_widget(self.speech_box)
+        ''' displays dialogue of character on screen; customers thank the
+        player for serving them, or say what they ordered
+        '''
+        speech = "Hey there!"
+        orders = self.simulation.orders
+        if self.controls.served is not None:
+            speech = "Thank you!"
+        elif orders is not None:
+            order = orders.order_of(self.controls.npc)
+            if order is not None:
+                speech = "I ordered " + order.describe() + "."
+        self.speech_box = POOLS.acquire(CharacterSpeechBox)
+        self.speech_box.update_text(self._speaker, speech)
+        self._show_dialogue(self.speech_box)
+
+
+    def _show_dialogue(self, w):
+        ''' shows a dialogue box over the cafe, on the window so that the
+        camera leaves it in place
+        '''
+        self._dialogues.append(w)
+        Window.add_widget(w)
 
 
     def _bind(self):
@@ -177,59 +343,479 @@ class MonsterCafe(Widget):
         self.bind(on_item_obtained=self.on_item_obtained_cb)
         
 
+    def plan(self, npc_count=10, item_count=0, seed=None):
+        ''' picks what the cafe will be filled with, without creating any
+        widget, so that its images can be preloaded before it is built
+
+        Keyword arguments:
+        npc_count   -- the amount of NPCs in the cafe
+        item_count  -- the amount of randomly picked food items
+        seed        -- seed of the floor and of every placement; a random
+                       one is picked if None
+        '''
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng = random.Random(self.seed)
+        self._planned_npcs, self._planned_foods = plan_cafe(
+            self.rng, npc_count, item_count)
+
+
+    def plan_scene(self, filename):
+        ''' plans to fill the cafe with a scene saved by scene.py instead,
+        of which only the chunks around the player are built
+
+        Keyword arguments:
+        filename    -- the scene file
+        '''
+        self.scene = SceneFile(filename)
+
+
+    def required_assets(self):
+        ''' returns the atlas pages and the (sheet, frame) of every other
+        sprite the planned cafe shows
+        '''
+        if self.scene is not None:
+            npcs, foods = self.scene.sprites, self.scene.foods
+            tiles = set(self.scene.tileset.values())
+        else:
+            npcs, foods = self._planned_npcs, self._planned_foods
+            tiles = set("floor_" + str(i)
+                        for i in range(1, Floor.TILE_KINDS + 1))
+        pages = atlas_pages('floor') + atlas_pages('food')
+        sprites = [(Floor.SHEET, frame)
+                   for frame in sorted(tiles - atlas_names('floor'))]
+
+        characters = set(npcs)
+        characters.add(self.player.image.image_name)
+        if self.player.image.use_atlas:
+            pages += atlas_pages('chars')
+        else:
+            for name in sorted(characters):
+                for state in Character.STATES:
+                    sprites += Character.frame_keys(name, state)
+
+        sprites += [(Item.SHEET, food)
+                    for food in sorted(set(foods) - atlas_names('food'))]
+        return pages, sprites
+
+
     def build(self):
+        ''' fills the cafe with the planned NPCs and items, randomly
+        placed, or with the chunks of the planned scene around the player
+        '''
+        if self.scene is not None:
+            self._build_scene()
+            return
+
+        self._build_sprites()
         # randomly adds NPC everywhere
-        for i in range(10):
-            n = NonPlayerCharacterImage(
-                name="big_demon" + str(i), image_name="big_demon")
-            #n = Item("apple", item_name="Apple")
-            self.add_widget(n)
-            self._randomly_place(self.children[0])
+        placed = []
+        for i, image_name in enumerate(self._planned_npcs):
+            placed.append(POOLS.acquire(
+                NonPlayerCharacterImage, name=image_name + str(i),
+                image_name=image_name))
+            self._show_sprite(placed[-1])
+
+        for food in self._planned_foods:
+            placed.append(POOLS.acquire(
+                Item, referred_name=food.lower(), item_name=food))
+            self._show_sprite(placed[-1])
 
         self.add_widget(self.player.image)
 
-        for w in self.children:
-            try:
-                w.build()
-            except AttributeError:
-                continue
+        for w in placed + [self.player.image]:
+            w.build()
+        # placed once built, so that only their sprites decide where
+        for w in placed:
+            self._randomly_place(w)
+        self.store_floor.build(self.rng.getrandbits(32))
+
+        self.simulation = Simulation(*Window.size)
+        for w in placed + [self.player.image]:
+            self._add_entity(w)
+        self.simulation.ai = cafe_ai(self.simulation,
+                                     self.rng.getrandbits(32))
+        self.simulation.orders = CafeOrders(
+            self.simulation, random.Random(self.rng.getrandbits(32)))
+        self.simulation.orders.spawn = self._spawn_dish
+        self._attach_controls()
 
         self._bind()
 
 
+    def _build_scene(self):
+        ''' builds the player where the scene starts, and the chunks
+        around it; the other chunks are built as the player gets near
+        them, and those left behind are taken down
+        '''
+        scene = self.scene
+        self._build_sprites()
+        self.add_widget(self.player.image)
+        self.player.image.pos = scene.start
+        self.player.image.build()
+        self.store_floor.build_scene(scene.tileset)
+
+        self.simulation = Simulation(scene.width, scene.height)
+        self._add_entity(self.player.image)
+        self._attach_controls()
+        self.streamer = ChunkStreamer(scene, self.simulation,
+                                      on_load=self._show_chunk,
+                                      on_unload=self._hide_chunk)
+        self.streamer.follow(*self.simulation.player.pos)
+        self.camera = self._camera_at(self.simulation.player.pos)
+
+        self._bind()
+
+
+    def _show_chunk(self, key, layers, entities):
+        ''' draws a chunk loaded by the streamer, with a pooled widget
+        rendering every entity of it
+        '''
+        self.store_floor.show_chunk(key, self.scene.chunk_origin(key),
+                                    layers)
+        for e in entities:
+            record = self.streamer.record(e)
+            if isinstance(e, NonPlayerEntity):
+                w = POOLS.acquire(
+                    NonPlayerCharacterImage, name=e.name,
+                    movement_list=e.movement_list,
+                    image_name=record['sprite'])
+            else:
+                w = POOLS.acquire(Item, referred_name=e.name,
+                                  item_name=record['food'])
+            # the widget renders the streamed entity rather than its own
+            w.entity = e
+            w.pos = e.pos
+            self._show_sprite(w, index=len(self.children) - 1)
+            w.build()
+            self._widgets[e] = w
+
+
+    def _hide_chunk(self, key, entities):
+        ''' takes down a chunk unloaded by the streamer, putting the
+        widgets of its entities back in their pools
+        '''
+        self.store_floor.hide_chunk(key)
+        for e in entities:
+            w = self._widgets.pop(e)
+            self._motion.pop(w, None)
+            self._release_sprite(w)
+
+
+    def _build_sprites(self):
+        ''' adds the sprite batch over the floor, when batched '''
+        if self.batched:
+            self.sprites = SpriteBatch()
+            self.add_widget(self.sprites)
+
+
+    def _show_sprite(self, w, index=0):
+        ''' shows the widget of an NPC or item, through the sprite batch
+        when batched
+
+        Keyword arguments:
+        w       -- the widget
+        index   -- where the widget is added among the children otherwise
+        '''
+        if self.sprites is None:
+            self.add_widget(w, index=index)
+            return
+        self.sprites.add(w)
+        self._animated[w] = None
+
+
+    def _release_sprite(self, w):
+        ''' stops showing the widget of an NPC or item and puts it back in
+        its pool
+        '''
+        if self.sprites is not None and w in self.sprites:
+            self.sprites.remove(w)
+            self._animated.pop(w, None)
+        POOLS.release(w)
+
+
+    def _camera_at(self, pos):
+        ''' returns the bottom-left of the part of the cafe shown with the
+        player at a position
+        '''
+        player = self.simulation.player
+        return camera_at((pos[0] + player.width / 2,
+                          pos[1] + player.height / 2),
+                         Window.size,
+                         (self.simulation.width, self.simulation.height))
+
+
+    def _attach_controls(self):
+        ''' has the controls, then the cafe, follow the collision events
+        of the simulation
+        '''
+        self.controls.attach(self.simulation)
+        self.simulation.events.bind(self._on_collisions)
+
+
+    def log_header(self):
+        ''' returns what a recording of the built cafe starts from '''
+        return LogHeader(self.seed, int(self.simulation.width),
+                         int(self.simulation.height),
+                         len(self._planned_npcs), len(self._planned_foods))
+
+
+    def on_size(self, instance, value):
+        ''' keeps the simulation as large as the cafe, unless it is as
+        large as its scene
+        '''
+        if self.simulation is not None and self.scene is None:
+            self.simulation.width, self.simulation.height = value
+
+
+    def _add_entity(self, w):
+        ''' adds the entity of a built widget to the simulation '''
+        self._widgets[w.entity] = w
+        self.simulation.add_entity(w.entity)
+
+
+    def spawn_item(self, food, pos=None):
+        ''' adds a food item at a position of the running cafe, or a
+        random spot, reusing a released item widget if there is one
+        '''
+        w = POOLS.acquire(Item, referred_name=food.lower(), item_name=food)
+        # drawn over the floor, under everything else
+        self._show_sprite(w, index=len(self.children) - 1)
+        if pos is None:
+            self._randomly_place(w)
+        else:
+            w.pos = pos
+        w.build()
+        self._add_entity(w)
+        return w
+
+
+    def _spawn_dish(self, food, pos):
+        ''' puts out a dish of a cooked order as an item widget '''
+        return self.spawn_item(food, pos).entity
+
+
+    def despawn(self, w):
+        ''' removes an item or NPC from the running cafe, putting its
+        widget back in its pool
+        '''
+        self.simulation.remove_entity(w.entity)
+        del self._widgets[w.entity]
+        self._motion.pop(w, None)
+        self._release_sprite(w)
+
+
     def _randomly_place(self, w):
-        s = Window.size
-        w.x = random.randint(0, s[0] - w.right)
-        w.y = random.randint(0, s[1] - w.top)
+        w.pos = random_spot(self.rng, Window.size, w.size)
+        if w.entity is not None:
+            w.entity.x, w.entity.y = w.pos
+
+
+    def add_widget(self, widget, *args, **kwargs):
+        super().add_widget(widget, *args, **kwargs)
+        if isinstance(widget, (LoopingImage, FloatingImage)):
+            self._animated[widget] = None
+
+
+    def remove_widget(self, widget, *args, **kwargs):
+        super().remove_widget(widget, *args, **kwargs)
+        self._animated.pop(widget, None)
+
+
+    def _on_screen(self, w):
+        ''' checks if the entity of a widget is on screen; entities are
+        checked rather than widgets, which are drawn between two ticks
+        '''
+        e = w.entity
+        left, bottom = self.camera
+        return not (e.x + e.width < left or e.x > left + self.width
+                    or e.y + e.height < bottom
+                    or e.y > bottom + self.height)
 
 
-    def update_image(self, dt):
-        for w in self.children:
-            try:
-                w.update_image()
-            except AttributeError:
+    @profiled('MonsterCafe.update_image')
+    def update_image(self):
+        ''' animates every animated child that is on screen and not paused;
+        idle characters are animated at a lower frame rate
+        '''
+        PROFILER.gauge('widgets', len(self.children))
+        PROFILER.gauge('animated', len(self._animated))
+        PROFILER.gauge('entities', len(self.simulation.entities))
+        if PROFILER.enabled:
+            for name, value in SPRITES.stats().items():
+                PROFILER.gauge('sprites.' + name, value)
+            for name, value in TEXTS.stats().items():
+                PROFILER.gauge('texts.' + name, value)
+            for name, value in self.simulation.navigation.stats().items():
+                PROFILER.gauge('navigation.' + name, value)
+            if self.sprites is not None:
+                for name, value in self.sprites.stats().items():
+                    PROFILER.gauge('batch.' + name, value)
+            for name, value in self.simulation.events.stats().items():
+                PROFILER.gauge('events.' + name, value)
+            if self.simulation.ai is not None:
+                for name, value in self.simulation.ai.stats().items():
+                    PROFILER.gauge('ai.' + name, value)
+            for name, value in self.simulation.timers.stats().items():
+                PROFILER.gauge('timers.' + name, value)
+            if self.simulation.orders is not None:
+                for name, value in self.simulation.orders.stats().items():
+                    PROFILER.gauge('orders.' + name, value)
+            for cls, stats in POOLS.stats().items():
+                for name, value in stats.items():
+                    PROFILER.gauge('pools.' + cls + '.' + name, value)
+
+        self._image_tick += 1
+        skip_idle = self._image_tick % self.IDLE_FRAME_SKIP != 0
+        for w in self._animated:
+            if w.paused or not self._on_screen(w):
                 continue
-    
+            if skip_idle and getattr(w, 'image_state', None) == "idle":
+                continue
+            w.update_image()
+
+
+    @profiled('MonsterCafe.tick')
+    def tick(self):
+        ''' advances the cafe by a single timestep: the chunks of a scene
+        are streamed around the player, the player moves while a movement
+        key is held, then the NPCs do, and the images are animated every
+        IMAGE_TICKS ticks
+        '''
+        simulation = self.simulation
+        player = simulation.player
+        if self.streamer is not None:
+            self.streamer.follow(*player.pos)
+        population = simulation.population
+        player_from = player.pos
+        npcs_x = population.x[:len(population.entities)].copy()
+        npcs_y = population.y[:len(population.entities)].copy()
+        if simulation.ai is not None:
+            left, bottom = self.camera
+            simulation.ai.view = (left, bottom, left + Window.width,
+                                  bottom + Window.height)
+
+        # what moved during the last tick has arrived
+        for w, (start, end) in self._motion.items():
+            self._motion[w] = (end, end)
+
+        if self.controls.tick() == CafeControls.MOVE:
+            self.player.image.sync_state()
+            self._motion[self.player.image] = (player_from, player.pos)
+
+        for e in simulation.step():
+            w = self._widgets[e]
+            w.sync_state()
+            self._motion[w] = ((float(npcs_x[e.slot]),
+                                float(npcs_y[e.slot])), e.pos)
+        self.camera = self._camera_at(player.pos)
+
+        if simulation.tick % self.IMAGE_TICKS == 0:
+            self.update_image()
+
+
+    @profiled('MonsterCafe.render')
+    def render(self, alpha):
+        ''' draws the widgets that moved during the last tick between where
+        they were and where they are
+
+        Keyword arguments:
+        alpha   -- how far into the next tick the frame is, from 0 to 1
+        '''
+        for w, (start, end) in list(self._motion.items()):
+            w.pos = (start[0] + (end[0] - start[0]) * alpha,
+                     start[1] + (end[1] - start[1]) * alpha)
+            if start == end:
+                del self._motion[w]
+        left, bottom = self._camera_at(self.player.image.pos)
+        self._camera.xy = (-left, -bottom)
+        if self.sprites is not None:
+            self.sprites.draw()
 
-    def update_movement(self, dt):
-        for w in self.children:
-            if isinstance(w, NonPlayerCharacterImage):
-                if not self.player.image.is_overlapping(w):
-                    w.update_movement()
+
+    def update(self, dt):
+        ''' runs the ticks due since the last frame, then draws it '''
+        if self.loop.advance(dt):
+            PROFILER.gauge('loop.skipped', self.loop.skipped)
+        self.render(self.loop.alpha)
 
 
 class MonsterCafeApp(App):
-    IMAGE_UPDATE_SPEED = 10.0/60.0
-    MOVEMENT_UPDATE_SPEED = 5.0/60.0
+    # frames are drawn at this rate, the simulation ticks at its own
+    FRAME_SPEED = 1.0/60.0
+    # when set, the game is profiled and the results are written to
+    # <PROFILE>.json and <PROFILE>.csv on exit
+    PROFILE = os.environ.get('MONSTERCAFE_PROFILE')
+    # when set, the bytes of sprite textures kept before evicting any
+    TEXTURE_BUDGET = os.environ.get('MONSTERCAFE_TEXTURE_BUDGET')
+    # when set, the input is recorded to <RECORD>, to be replayed with
+    # replay.py; SEED fixes the seed the cafe is built from
+    RECORD = os.environ.get('MONSTERCAFE_RECORD')
+    SEED = os.environ.get('MONSTERCAFE_SEED')
+    # when set, the cafe is the scene saved in <SCENE> by scene.py, which
+    # can't be recorded
+    SCENE = os.environ.get('MONSTERCAFE_SCENE')
+    # when set, the NPCs and items are drawn by a single sprite batch
+    # rather than as a widget each
+    BATCHED = os.environ.get('MONSTERCAFE_BATCHED')
 
     def build(self):
-        cafe = MonsterCafe()
+        ''' shows a loading screen while the images of the cafe are
+        preloaded, so that none is loaded once the game is running
+        '''
+        if self.PROFILE:
+            PROFILER.enable()
+        if self.TEXTURE_BUDGET:
+            SPRITES.budget = int(self.TEXTURE_BUDGET)
+
+        self.cafe = MonsterCafe()
+        self.cafe.batched = bool(self.BATCHED)
+        if self.SCENE:
+            self.cafe.plan_scene(self.SCENE)
+        else:
+            self.cafe.plan(seed=int(self.SEED) if self.SEED else None)
+        loading = LoadingAlert()
+        self.preloader = AssetPreloader(*self.cafe.required_assets())
+        self.preloader.start(loading.update_progress, self._show_cafe)
+        return loading
+
+
+    def _show_cafe(self):
+        ''' builds the cafe once its images are loaded and shows it in
+        place of the loading screen
+        '''
+        cafe = self.cafe
         cafe.build()
-        Clock.schedule_interval(cafe.update_image, 
-                                self.IMAGE_UPDATE_SPEED)
-        Clock.schedule_interval(cafe.update_movement, 
-                                self.MOVEMENT_UPDATE_SPEED)
-        return cafe
+        if self.RECORD and cafe.scene is None:
+            cafe.recorder = InputRecorder(self.RECORD, cafe.log_header())
+            # the same NPCs have to think on every tick of the replay,
+            # however long they take
+            cafe.simulation.ai.budget = None
+        Window.remove_widget(self.root)
+        self.root = cafe
+        Window.add_widget(cafe)
+
+        Clock.schedule_interval(cafe.update, self.FRAME_SPEED)
+
+        if self.PROFILE:
+            self._show_profiler()
+
+
+    def _show_profiler(self):
+        ''' draws the profiler overlay over the cafe and times frames '''
+        overlay = ProfilerOverlay(PROFILER)
+        Window.add_widget(overlay)
+        Clock.schedule_interval(overlay.refresh,
+                                ProfilerOverlay.REFRESH_SPEED)
+        Clock.schedule_interval(partial(PROFILER.record, 'frame'), 0)
+
+
+    def on_stop(self):
+        if self.PROFILE:
+            PROFILER.dump(self.PROFILE)
+        if self.cafe.recorder is not None:
+            self.cafe.recorder.close(self.cafe.simulation.tick,
+                                     state_digest(self.cafe.simulation))
+            self.cafe.recorder = None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,229 @@
+import heapq
+import math
+
+
+# what a search that gave up returns, as it does not know if there is a
+# path
+_GAVE_UP = object()
+
+
+class NavigationGrid(object):
+    ''' obstacle map over the tile grid of the cafe, finding paths between
+    its cells with A* and caching them, so that NPCs walking the same
+    routes share them
+    '''
+    # the size of the floor's tiles
+    CELL_SIZE = 32
+    MAX_PATHS = 4096
+    NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+    def __init__(self, cols, rows, cell_size=None):
+        self.cols, self.rows = cols, rows
+        self.cell_size = cell_size if cell_size is not None else self.CELL_SIZE
+        # how many things block each blocked cell
+        self.obstacles = {}
+        # cached paths by (start, goal), and the keys of the cached paths
+        # crossing each cell, so that blocking a cell only drops those
+        self._paths = {}
+        self._through = {}
+        self._failures = set()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # searches given up on reaching their limit
+        self.abandoned = 0
+
+
+    @classmethod
+    def covering(cls, width, height, cell_size=None):
+        ''' returns a grid with enough cells to cover an area in pixels '''
+        cell_size = cell_size if cell_size is not None else cls.CELL_SIZE
+        return cls(math.ceil(width / cell_size),
+                   math.ceil(height / cell_size), cell_size)
+
+
+    def resize(self, width, height):
+        ''' covers a new area in pixels, dropping every cached path if the
+        amount of cells changed
+        '''
+        cols = math.ceil(width / self.cell_size)
+        rows = math.ceil(height / self.cell_size)
+        if (cols, rows) != (self.cols, self.rows):
+            self.cols, self.rows = cols, rows
+            self.clear_paths()
+
+
+    def cell_at(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+
+    def cell_center(self, cell):
+        return ((cell[0] + 0.5) * self.cell_size,
+                (cell[1] + 0.5) * self.cell_size)
+
+
+    def cells_of(self, box):
+        ''' returns the cells covered by a (left, bottom, right, top) box '''
+        left, bottom = self.cell_at(box[0], box[1])
+        right, top = self.cell_at(box[2], box[3])
+        return [(col, row) for col in range(left, right + 1)
+                for row in range(bottom, top + 1)]
+
+
+    def in_bounds(self, cell):
+        return 0 <= cell[0] < self.cols and 0 <= cell[1] < self.rows
+
+
+    def is_blocked(self, cell):
+        return cell in self.obstacles
+
+
+    def block(self, cells):
+        ''' marks cells as blocked, dropping the cached paths crossing the
+        ones that were free
+        '''
+        for cell in cells:
+            self.obstacles[cell] = self.obstacles.get(cell, 0) + 1
+            if self.obstacles[cell] == 1:
+                for key in list(self._through.get(cell, ())):
+                    self._forget(key)
+                    self.invalidations += 1
+
+
+    def unblock(self, cells):
+        ''' marks cells as no longer blocked by one of the things blocking
+        them; cached paths stay valid, but paths that were not found may
+        now exist, so those are dropped
+        '''
+        freed = False
+        for cell in cells:
+            count = self.obstacles.get(cell, 0) - 1
+            if count > 0:
+                self.obstacles[cell] = count
+            elif cell in self.obstacles:
+                del self.obstacles[cell]
+                freed = True
+        if freed:
+            for key in list(self._failures):
+                self._forget(key)
+
+
+    def clear_paths(self):
+        self._paths.clear()
+        self._through.clear()
+        self._failures.clear()
+
+
+    def _remember(self, key, path):
+        if len(self._paths) >= self.MAX_PATHS:
+            self._forget(next(iter(self._paths)))
+        self._paths[key] = path
+        if path is None:
+            self._failures.add(key)
+            return
+        for cell in path:
+            self._through.setdefault(cell, set()).add(key)
+
+
+    def _forget(self, key):
+        path = self._paths.pop(key)
+        if path is None:
+            self._failures.discard(key)
+            return
+        for cell in path:
+            keys = self._through[cell]
+            keys.discard(key)
+            if not keys:
+                del self._through[cell]
+
+
+    def find_path(self, start, goal, limit=None):
+        ''' returns the cells of a shortest path from a cell to another,
+        both included, or None if the goal can't be reached; the start is
+        allowed to be blocked, as whoever stands there blocks it
+
+        Keyword arguments:
+        start   -- the (col, row) of the first cell
+        goal    -- the (col, row) of the last cell
+        limit   -- the cells searched at most, after which None is returned
+                   without remembering the goal as unreachable
+        '''
+        key = (start, goal)
+        if key in self._paths:
+            self.hits += 1
+            return self._paths[key]
+        self.misses += 1
+        path = self._search(start, goal, limit)
+        if path is _GAVE_UP:
+            self.abandoned += 1
+            return None
+        self._remember(key, path)
+        return path
+
+
+    def _search(self, start, goal, limit=None):
+        ''' A* over the free cells, moving in the four directions '''
+        if not self.in_bounds(goal) or self.is_blocked(goal):
+            return None
+        if start == goal:
+            return (start,)
+
+        def distance(cell):
+            return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+        cols, rows, obstacles = self.cols, self.rows, self.obstacles
+        came_from = {start: None}
+        cost = {start: 0}
+        closed = set()
+        # the counter breaks ties in the order cells were found
+        frontier = [(distance(start), 0, start)]
+        found = 0
+        while frontier:
+            estimate, order, cell = heapq.heappop(frontier)
+            if cell == goal:
+                break
+            if cell in closed:
+                continue
+            closed.add(cell)
+            if limit is not None and len(closed) > limit:
+                return _GAVE_UP
+            new_cost = cost[cell] + 1
+            for dx, dy in self.NEIGHBOURS:
+                neighbour = (cell[0] + dx, cell[1] + dy)
+                if (not (0 <= neighbour[0] < cols and 0 <= neighbour[1] < rows)
+                        or neighbour in obstacles or neighbour in closed):
+                    continue
+                if new_cost < cost.get(neighbour, new_cost + 1):
+                    cost[neighbour] = new_cost
+                    came_from[neighbour] = cell
+                    found += 1
+                    heapq.heappush(frontier, (new_cost + distance(neighbour),
+                                              found, neighbour))
+        else:
+            return None
+
+        path = [goal]
+        while path[-1] != start:
+            path.append(came_from[path[-1]])
+        return tuple(reversed(path))
+
+
+    def stats(self):
+        return {'paths': len(self._paths), 'obstacles': len(self.obstacles),
+                'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations,
+                'abandoned': self.abandoned}
+
+
+def turning_points(path):
+    ''' returns the cells of a path where it changes direction, along with
+    its last cell
+    '''
+    points = []
+    for i in range(1, len(path)):
+        if (i == len(path) - 1
+                or (path[i][0] - path[i - 1][0], path[i][1] - path[i - 1][1])
+                != (path[i + 1][0] - path[i][0],
+                    path[i + 1][1] - path[i][1])):
+            points.append(path[i])
+    return points
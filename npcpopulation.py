@@ -0,0 +1,179 @@
+import numpy
+
+
+class NPCPopulation(object):
+    ''' patrol state of every NPC of the simulation, kept in contiguous
+    arrays so that all NPCs are advanced in a single vectorized step
+    '''
+    CAPACITY = 64
+    ARRAYS = ('x', 'y', 'speed', 'remaining', 'move_index', 'patrol_start',
+              'patrol_length', 'one_way', 'running', 'box', 'cells')
+
+    def __init__(self, capacity=None):
+        capacity = capacity if capacity is not None else self.CAPACITY
+        self.entities = []
+        self.x = numpy.zeros(capacity)
+        self.y = numpy.zeros(capacity)
+        self.speed = numpy.zeros(capacity)
+        # the amount of moves in each axis that every NPC still expects
+        self.remaining = numpy.zeros((capacity, 2), dtype=numpy.int64)
+        self.move_index = numpy.zeros(capacity, dtype=numpy.int64)
+        # where the patrol of every NPC starts in the patrol table, and
+        # how many offsets it has
+        self.patrol_start = numpy.zeros(capacity, dtype=numpy.int64)
+        self.patrol_length = numpy.zeros(capacity, dtype=numpy.int64)
+        # NPCs on a one way route stop at its end rather than starting it
+        # over
+        self.one_way = numpy.zeros(capacity, dtype=bool)
+        self.running = numpy.zeros(capacity, dtype=bool)
+        # the (left, bottom, right, top) of every NPC's hitbox relative to
+        # its position, and the spatial hash cells the hitbox covers
+        self.box = numpy.zeros((capacity, 4))
+        self.cells = numpy.zeros((capacity, 4), dtype=numpy.int64)
+
+        # offsets of every patrol, shared by all NPCs with the same patrol
+        self.patrol_table = numpy.zeros((0, 2), dtype=numpy.int64)
+        self._patrols = {}
+        # the slots of the NPCs that reached the end of a one way route
+        # during the last step
+        self.ended = numpy.zeros(0, dtype=numpy.int64)
+
+
+    def __len__(self):
+        return len(self.entities)
+
+
+    def _grow(self):
+        ''' doubles the capacity of every per-NPC array '''
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            grown = numpy.zeros((len(array) * 2,) + array.shape[1:],
+                                dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+
+    def _patrol_slice(self, movement_list):
+        ''' returns where a patrol starts in the patrol table and its
+        length, adding it to the table the first time it is seen
+        '''
+        key = tuple(tuple(offset) for offset in movement_list)
+        if key not in self._patrols:
+            start = len(self.patrol_table)
+            if key:
+                self.patrol_table = numpy.concatenate(
+                    (self.patrol_table, numpy.array(key, dtype=numpy.int64)))
+            self._patrols[key] = (start, len(key))
+        return self._patrols[key]
+
+
+    def add(self, entity, cells):
+        ''' adds an NPC entity to the population, after which its position
+        is read from and written to the population's arrays
+
+        Keyword arguments:
+        entity  -- the NPC, with its sprite already set
+        cells   -- the spatial hash cells its hitbox covers
+        '''
+        slot = len(self.entities)
+        if slot == len(self.x):
+            self._grow()
+        self.x[slot], self.y[slot] = entity.x, entity.y
+        self.speed[slot] = entity.MOVEMENT_SPEED
+        self.running[slot] = entity.state == "run"
+        self.box[slot] = (entity.left_pad, entity.bottom_pad,
+                          entity.width - entity.right_pad,
+                          entity.height - entity.top_pad)
+        self.cells[slot] = cells
+
+        self.entities.append(entity)
+        entity.population, entity.slot = self, slot
+        self.set_patrol(entity, entity.movement_list, entity.one_way)
+
+
+    def remove(self, entity):
+        ''' removes an NPC entity, moving the last NPC into its slot '''
+        slot, last = entity.slot, len(self.entities) - 1
+        x, y = float(self.x[slot]), float(self.y[slot])
+        moved = self.entities.pop()
+        if moved is not entity:
+            self.entities[slot] = moved
+            moved.slot = slot
+            for name in self.ARRAYS:
+                array = getattr(self, name)
+                array[slot] = array[last]
+        entity.population, entity.slot = None, None
+        entity.x, entity.y = x, y
+
+
+    def set_patrol(self, entity, movement_list, one_way=False):
+        ''' restarts the patrol of an NPC with a new list of offsets, which
+        is walked once if one way
+        '''
+        slot = entity.slot
+        start, length = self._patrol_slice(movement_list)
+        self.patrol_start[slot] = start
+        self.patrol_length[slot] = length
+        self.one_way[slot] = one_way
+        self.move_index[slot] = 1 % max(length, 1)
+        self.remaining[slot] = 0
+
+
+    def step(self, blocked=None):
+        ''' advances the patrol of every NPC by a step, returning the slots
+        of the NPCs that moved or started running; those reaching the end
+        of a one way route are left in ended, no longer patrolling
+
+        Keyword arguments:
+        blocked -- slots of the NPCs that can not move this step
+        '''
+        count = len(self.entities)
+        active = self.patrol_length[:count] > 0
+        if blocked:
+            active[list(blocked)] = False
+
+        remaining = self.remaining[:count]
+        move_index = self.move_index[:count]
+
+        # if no more movements left, shift to the next set of offsets
+        shift = active & ~remaining.any(axis=1)
+        # one way routes end instead of shifting back to their start
+        ended = shift & self.one_way[:count] & (move_index == 0)
+        self.ended = numpy.flatnonzero(ended)
+        if len(self.ended):
+            self.patrol_length[self.ended] = 0
+            self.running[self.ended] = False
+            active &= ~ended
+            shift &= ~ended
+        remaining[shift] = self.patrol_table[
+            self.patrol_start[:count][shift] + move_index[shift]]
+        move_index[shift] = ((move_index[shift] + 1)
+                             % self.patrol_length[:count][shift])
+
+        # every NPC moves a step toward the remaining offsets, which are
+        # reduced accordingly
+        direction = numpy.sign(remaining) * active[:, None]
+        remaining -= direction
+        speed = self.speed[:count]
+        self.x[:count] += direction[:, 0] * speed
+        self.y[:count] += direction[:, 1] * speed
+
+        started = active & ~self.running[:count]
+        self.running[:count] |= active
+        for slot in numpy.flatnonzero(started):
+            self.entities[slot].state = "run"
+
+        return numpy.flatnonzero(active & (direction.any(axis=1) | started))
+
+
+    def recell(self, slots, cell_size):
+        ''' updates the spatial hash cells covered by the hitboxes of some
+        NPCs, returning the slots of those whose cells changed
+        '''
+        position = numpy.stack((self.x[slots], self.y[slots],
+                                self.x[slots], self.y[slots]), axis=1)
+        cells = numpy.floor((position + self.box[slots]) / cell_size)
+        cells = cells.astype(numpy.int64)
+        changed = (cells != self.cells[slots]).any(axis=1)
+        self.cells[slots] = cells
+        return slots[changed]
@@ -0,0 +1,238 @@
+import collections
+import random
+
+from simulation import ItemEntity
+from spriteindex import food_names
+
+
+FOOD_FOLDER = 'Images/food/'
+
+# what happens to an order, as given to the handlers
+PLACED = 'placed'
+COOKING = 'cooking'
+READY = 'ready'
+SERVED = 'served'
+LEFT = 'left'
+
+
+def counter_cell(navigation):
+    ''' returns the (col, row) of the counter of a cafe, where customers
+    order and the dishes are put out
+    '''
+    return (navigation.cols // 2, navigation.rows - 3)
+
+
+class Order(object):
+    ''' the food a customer ordered, and how far along it is '''
+
+    def __init__(self, number, customer, foods, tick):
+        self.number = number
+        self.customer = customer
+        # the food sprites ordered, as named by Item
+        self.foods = foods
+        self.placed = tick
+        self.state = PLACED
+        # the timer of the customer's patience, and of the cooking
+        self.patience = None
+        self.cooking = None
+
+
+    @property
+    def items(self):
+        ''' returns the count of every item the order is served with, as
+        named in the ItemBag
+        '''
+        return collections.Counter(food.lower() for food in self.foods)
+
+
+    def describe(self):
+        return ", ".join(str(count) + " " + name
+                         for name, count in sorted(self.items.items()))
+
+
+class CafeOrders(object):
+    ''' the orders of the customers of a cafe, timed by the timers of its
+    simulation rather than checked on every tick: an order waits for one
+    of the cooks, in the order it was placed, is cooked for a time that
+    grows with its items, then its dishes are put out on the counter as
+    items; the player serves it by talking to the customer while holding
+    every item ordered, unless the customer runs out of patience first,
+    in which case the order is dropped: the customer stays in the cafe,
+    and may order again
+
+    every change of an order is dispatched to the handlers as it happens,
+    as (kind, order)
+    '''
+    COOKS = 2
+    # ticks taken to cook every item, and waited by a customer at most
+    COOK_TICKS = 36
+    PATIENCE = 720
+    MAX_ITEMS = 2
+    # the spots dishes are put out on, right of the counter, in turn
+    DISH_SPOTS = 6
+
+    def __init__(self, simulation, rng=None, foods=None):
+        ''' Keyword arguments:
+        simulation  -- the simulation whose timers and entities are used
+        rng         -- the random generator the foods are picked from
+        foods       -- the food sprites that can be ordered, all of them
+                       if None
+        '''
+        self.simulation = simulation
+        self.rng = rng if rng is not None else random.Random()
+        self.foods = foods if foods is not None else food_names()
+        # the open order of every customer, and the orders waiting for
+        # a cook, first placed first
+        self.orders = {}
+        self.kitchen = collections.deque()
+        # the orders of the kitchen still open, which closed ones are only
+        # dropped from once a cook gets to them
+        self.waiting = 0
+        self.cooks_busy = 0
+        # puts a dish out at a position, returning its entity
+        self.spawn = self.spawn_dish
+        self._handlers = []
+        self._placed = 0
+        self._dishes = 0
+        self.counts = collections.Counter()
+
+
+    def bind(self, handler):
+        self._handlers.append(handler)
+
+
+    def unbind(self, handler):
+        self._handlers.remove(handler)
+
+
+    def _dispatch(self, kind, order):
+        order.state = kind
+        self.counts[kind] += 1
+        for handler in list(self._handlers):
+            handler(kind, order)
+
+
+    def order_of(self, customer):
+        ''' returns the open order of a customer, or None '''
+        return self.orders.get(customer)
+
+
+    def place(self, customer, foods=None):
+        ''' has a customer order food, picked at random if not given,
+        returning the Order; a customer has one open order at most
+
+        Keyword arguments:
+        customer    -- the NPC entity ordering
+        foods       -- the food sprites ordered, as named by Item
+        '''
+        if customer in self.orders:
+            return self.orders[customer]
+        if foods is None:
+            foods = [self.rng.choice(self.foods)
+                     for i in range(self.rng.randint(1, self.MAX_ITEMS))]
+        self._placed += 1
+        order = Order(self._placed, customer, foods, self.simulation.tick)
+        self.orders[customer] = order
+        order.patience = self.simulation.timers.schedule(
+            self.PATIENCE, self._lose_patience, order)
+        self.kitchen.append(order)
+        self.waiting += 1
+        self._dispatch(PLACED, order)
+        self._cook_next()
+        return order
+
+
+    def _cook_next(self):
+        ''' has every free cook start on the next order waiting '''
+        while self.cooks_busy < self.COOKS and self.kitchen:
+            order = self.kitchen.popleft()
+            if order.state != PLACED:
+                # closed while it waited
+                continue
+            self.waiting -= 1
+            self.cooks_busy += 1
+            order.cooking = self.simulation.timers.schedule(
+                self.COOK_TICKS * len(order.foods), self._cooked, order)
+            self._dispatch(COOKING, order)
+
+
+    def _cooked(self, order):
+        ''' puts the dishes of a cooked order out on the counter '''
+        self.cooks_busy -= 1
+        order.cooking = None
+        navigation = self.simulation.navigation
+        size = navigation.cell_size
+        col, row = counter_cell(navigation)
+        # spots past the edge of a small cafe are kept within it
+        right = max(self.simulation.width - size, 0)
+        top = max(self.simulation.height - size, 0)
+        for food in order.foods:
+            spot = 3 + self._dishes % self.DISH_SPOTS
+            self._dishes += 1
+            self.spawn(food, (min(max((col + spot) * size, 0), right),
+                              min(max(row * size, 0), top)))
+        self._dispatch(READY, order)
+        self._cook_next()
+
+
+    def spawn_dish(self, food, pos):
+        ''' adds a dish to the simulation as an item entity; the game puts
+        out item widgets instead
+        '''
+        e = ItemEntity.from_sprite(FOOD_FOLDER + food + '.png', food.lower())
+        e.x, e.y = pos
+        self.simulation.add_entity(e)
+        return e
+
+
+    def _close(self, order):
+        ''' stops the timers of an order, and its cooking if it was being
+        cooked, the cook only starting on the next order once the close
+        is dispatched
+        '''
+        del self.orders[order.customer]
+        if order.state == PLACED:
+            self.waiting -= 1
+        timers = self.simulation.timers
+        timers.cancel(order.patience)
+        if order.cooking is not None:
+            timers.cancel(order.cooking)
+            order.cooking = None
+            self.cooks_busy -= 1
+
+
+    def serve(self, customer, bag):
+        ''' serves the open order of a customer with the items of a bag,
+        returning the order, or None if the customer has none or the bag
+        lacks any of its items
+        '''
+        order = self.orders.get(customer)
+        if order is None or not bag.take_items(order.items):
+            return None
+        self._close(order)
+        self._dispatch(SERVED, order)
+        self._cook_next()
+        return order
+
+
+    def _lose_patience(self, order):
+        order.patience = None
+        self._close(order)
+        self._dispatch(LEFT, order)
+        self._cook_next()
+
+
+    def remove(self, customer):
+        ''' drops the open order of a customer leaving the cafe '''
+        order = self.orders.get(customer)
+        if order is not None:
+            self._close(order)
+            self._dispatch(LEFT, order)
+            self._cook_next()
+
+
+    def stats(self):
+        return {'open': len(self.orders), 'waiting': self.waiting,
+                'cooking': self.cooks_busy,
+                PLACED: self.counts[PLACED], READY: self.counts[READY],
+                SERVED: self.counts[SERVED], LEFT: self.counts[LEFT]}
@@ -0,0 +1,115 @@
+import kivy
+kivy.require('1.10.1')
+
+from kivy.cache import Cache
+from kivy.clock import Clock
+from kivy.core.image import ImageLoader
+
+from concurrent.futures import ThreadPoolExecutor
+
+from debugger import Debug
+from spritecache import SPRITES, SpriteCache
+
+
+class AssetPreloader(Debug):
+    ''' decodes images on a pool of threads and uploads them as textures
+    on the main thread, so that the widgets showing them never load an
+    image mid-game; atlas pages are put in kivy's image cache and every
+    other sprite in the shared sprite cache
+    '''
+    WORKERS = 4
+    # textures uploaded per frame, so the loading screen stays responsive
+    UPLOADS_PER_FRAME = 16
+
+    def __init__(self, pages=(), sprites=(), workers=None):
+        ''' Keyword arguments:
+        pages       -- the atlas pages to load, named exactly as the atlas
+                       requests them, since kivy caches them by that name
+        sprites     -- the (sheet, frame) of the sprites to load
+        workers     -- the amount of decoding threads
+
+        images already in their cache are skipped
+        '''
+        # every image to load, with its sprite cache key if it has one
+        self.jobs = [(f, None) for f in dict.fromkeys(pages)
+                     if Cache.get('kv.image', self.cache_key(f)) is None]
+        self.jobs += [(SpriteCache.sprite_file(*key), key)
+                      for key in dict.fromkeys(sprites) if key not in SPRITES]
+        self.workers = workers if workers is not None else self.WORKERS
+        self.loaded = 0
+        self._pending = []
+        self._executor = None
+        self._on_progress = None
+        self._on_complete = None
+
+
+    @staticmethod
+    def cache_key(filename):
+        ''' returns the key kivy caches an image without mipmaps under '''
+        return filename + '|0|0'
+
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+
+    def start(self, on_progress=None, on_complete=None):
+        ''' starts decoding every image
+
+        Keyword arguments:
+        on_progress -- called on the main thread with the amount of images
+                       loaded and the total after each upload
+        on_complete -- called on the main thread once every image loaded
+        '''
+        self._on_progress = on_progress
+        self._on_complete = on_complete
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._pending = [(job, self._executor.submit(self._decode, *job))
+                         for job in self.jobs]
+        Clock.schedule_interval(self._upload, 0)
+
+
+    def _decode(self, filename, key):
+        ''' runs on a worker thread, decoding the image without touching
+        the GL context; sprites are kept out of kivy's caches
+        '''
+        return ImageLoader.load(filename, nocache=key is not None)
+
+
+    def _upload(self, dt):
+        ''' turns decoded images into textures, in the order they were
+        requested, until the budget of the frame runs out
+        '''
+        uploads = 0
+        while self._pending and uploads < self.UPLOADS_PER_FRAME:
+            (filename, key), future = self._pending[0]
+            if not future.done():
+                break
+            self._pending.pop(0)
+            uploads += 1
+
+            try:
+                image = future.result()
+                # accessing the texture uploads it to the GPU and frees
+                # the pixel data
+                texture = image.texture
+                if key is None:
+                    Cache.append('kv.image', self.cache_key(filename), image)
+                else:
+                    SPRITES.put(key, texture)
+            except Exception as e:
+                self.debugPrint(type(self).__name__, "_upload",
+                                filename + ": " + str(e))
+
+            self.loaded += 1
+            if self._on_progress is not None:
+                self._on_progress(self.loaded, self.total)
+
+        if self._pending:
+            return True
+
+        self._executor.shutdown(wait=False)
+        if self._on_complete is not None:
+            self._on_complete()
+        return False
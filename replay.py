@@ -0,0 +1,349 @@
+import argparse
+import collections
+import json
+import random
+import struct
+import time
+import zlib
+
+from behaviours import cafe_ai
+from controls import CafeControls
+from orders import CafeOrders
+from simulation import (ItemEntity, NonPlayerEntity, PlayerEntity,
+                        Simulation)
+from spriteindex import SpriteIndex, food_names
+
+# TODO  Record window resizes once the window can be resized
+
+
+MAGIC = b'MCIN'
+VERSION = 5
+# magic, version, seed, width, height, amount of NPCs, amount of items
+HEADER = struct.Struct('<4sBIHHHH')
+END_DIGEST = struct.Struct('<I')
+
+# every event is the ticks since the last one as a varint, then a byte
+# holding its kind in the upper bits, the shift modifier and its key
+KEYS = ('left', 'right', 'up', 'down', 'enter', 'e')
+KEY_DOWN, KEY_UP, END = range(3)
+KIND_SHIFT = 5
+SHIFT = 0x10
+KEY_MASK = 0x0f
+
+NPC_NAME = 'big_demon'
+PLAYER_NAME = 'skelet'
+CHARS_FOLDER = 'Images/chars/'
+FOOD_FOLDER = 'Images/food/'
+# as LoopingImage and MonsterCafe animate the characters
+CYCLE_LENGTH = 4
+IDLE_FRAME_SKIP = 2
+IMAGE_TICKS = 2
+
+LogHeader = collections.namedtuple(
+    'LogHeader', ['seed', 'width', 'height', 'npcs', 'items'])
+Event = collections.namedtuple('Event', ['tick', 'kind', 'key', 'shift'])
+
+
+def plan_cafe(rng, npc_count, item_count):
+    ''' returns the names of the NPCs and the foods a cafe is filled with,
+    as picked by MonsterCafe.plan
+    '''
+    foods = food_names()
+    return [NPC_NAME] * npc_count, [rng.choice(foods)
+                                    for i in range(item_count)]
+
+
+def random_spot(rng, area, size):
+    ''' returns a random (x, y) at which something of a size fits in an
+    area
+    '''
+    return (rng.randint(0, area[0] - size[0]),
+            rng.randint(0, area[1] - size[1]))
+
+
+def frame_file(image_name, image_state, image_num):
+    ''' returns the sprite file of a frame of a character's animation '''
+    return '{}{}/{}_{}_anim_f{}.png'.format(
+        CHARS_FOLDER, image_name, image_name, image_state, image_num)
+
+
+def build_cafe(header):
+    ''' builds the simulation of a recorded cafe, placing its entities as
+    MonsterCafe.build placed their widgets, giving its NPCs the same
+    behaviours and taking their orders; returns it along with the
+    character name of every character entity
+    '''
+    rng = random.Random(header.seed)
+    npcs, foods = plan_cafe(rng, header.npcs, header.items)
+    size = (header.width, header.height)
+
+    entities, characters = [], {}
+    for i, name in enumerate(npcs):
+        e = NonPlayerEntity.from_sprite(frame_file(name, 'idle', 0),
+                                        name + str(i))
+        characters[e] = name
+        entities.append(e)
+    for food in foods:
+        entities.append(ItemEntity.from_sprite(
+            FOOD_FOLDER + food + '.png', food.lower()))
+    for e in entities:
+        e.x, e.y = random_spot(rng, size, (e.width, e.height))
+
+    player = PlayerEntity.from_sprite(frame_file(PLAYER_NAME, 'idle', 0),
+                                      PLAYER_NAME)
+    characters[player] = PLAYER_NAME
+    simulation = Simulation(*size)
+    for e in entities + [player]:
+        simulation.add_entity(e)
+    # the seed of the floor is drawn before those of the AI, which
+    # thinks for the same NPCs on every tick, and of the orders
+    rng.getrandbits(32)
+    simulation.ai = cafe_ai(simulation, rng.getrandbits(32))
+    simulation.ai.budget = None
+    simulation.orders = CafeOrders(simulation,
+                                   random.Random(rng.getrandbits(32)))
+    return simulation, characters
+
+
+def state_digest(simulation):
+    ''' returns a checksum of the state of a cafe, telling if a replay
+    ended where the recording did
+    '''
+    player = simulation.player
+    state = (simulation.tick, player.pos, sorted(player.bag),
+             [(e.name, round(e.x, 3), round(e.y, 3))
+              for e in simulation.entities])
+    return zlib.crc32(repr(state).encode())
+
+
+def _varint(value):
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+class InputRecorder(object):
+    ''' writes the keys the cafe receives to a compact binary log, timed
+    in ticks of the simulation
+    '''
+    # events written before the log is flushed to disk
+    FLUSH_EVERY = 256
+
+    def __init__(self, filename, header):
+        ''' Keyword arguments:
+        filename    -- the file the log is written to
+        header      -- the LogHeader the cafe was built from
+        '''
+        self._file = open(filename, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, *header))
+        self._tick = 0
+        self._unflushed = 0
+
+
+    def _write(self, tick, kind, key=0, shift=False, payload=b''):
+        self._file.write(_varint(tick - self._tick)
+                         + bytes([kind << KIND_SHIFT
+                                  | (SHIFT if shift else 0) | key])
+                         + payload)
+        self._tick = tick
+        self._unflushed += 1
+        if self._unflushed >= self.FLUSH_EVERY:
+            self._file.flush()
+            self._unflushed = 0
+
+
+    def key_down(self, tick, key, modifiers=None):
+        ''' records a key press; keys the cafe ignores are left out '''
+        if key in KEYS:
+            self._write(tick, KEY_DOWN, KEYS.index(key),
+                        modifiers is not None and "shift" in modifiers)
+
+
+    def key_up(self, tick, key):
+        if key in KEYS:
+            self._write(tick, KEY_UP, KEYS.index(key))
+
+
+    def close(self, tick, digest):
+        ''' ends the log with the tick and the state digest it ended at '''
+        self._write(tick, END, payload=END_DIGEST.pack(digest))
+        self._file.close()
+
+
+def read_log(filename):
+    ''' returns the LogHeader, the events and the (tick, digest) of the end
+    of a log, the end being None if the log was cut short
+    '''
+    with open(filename, 'rb') as f:
+        data = f.read()
+    magic, version, *fields = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a version " + str(VERSION) + " input log: "
+                         + filename)
+
+    events, end = [], None
+    tick, i = 0, HEADER.size
+    while i < len(data):
+        delta, shift = 0, 0
+        while True:
+            if i >= len(data):
+                return LogHeader(*fields), events, None
+            byte = data[i]
+            i += 1
+            delta |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        if i >= len(data):
+            break
+        tick += delta
+        kind, code = data[i] >> KIND_SHIFT, data[i]
+        i += 1
+        if kind == END:
+            if i + END_DIGEST.size <= len(data):
+                end = (tick, END_DIGEST.unpack_from(data, i)[0])
+            break
+        events.append(Event(tick, kind, KEYS[code & KEY_MASK],
+                            bool(code & SHIFT)))
+    return LogHeader(*fields), events, end
+
+
+class Replay(object):
+    ''' plays a recorded log back on a headless cafe, ticking it as
+    MonsterCafe.tick does and animating its characters as
+    MonsterCafe.update_image does, so that they collide with the same
+    frames
+    '''
+
+    def __init__(self, header, events, end=None):
+        self.header = header
+        self.events = events
+        self.end = end
+        self.simulation, self._characters = build_cafe(header)
+        self.controls = CafeControls(self.simulation)
+        # the animation shown by every character, and its frame
+        self._shown = {e: 'idle' for e in self._characters}
+        self._frames = {e: 0 for e in self._characters}
+        self._image_tick = 0
+
+
+    @classmethod
+    def load(cls, filename):
+        return cls(*read_log(filename))
+
+
+    def _show(self, entity):
+        ''' shows the current animation of a character, as syncing its
+        widget did
+        '''
+        if self._shown[entity] != entity.state:
+            self._shown[entity] = entity.state
+            self._refresh(entity)
+
+
+    def _refresh(self, entity):
+        entity.sprite = frame_file(self._characters[entity],
+                                   self._shown[entity], self._frames[entity])
+
+
+    def _animate(self):
+        ''' moves every character on screen to its next frame, idle ones
+        every other time
+        '''
+        self._image_tick += 1
+        skip_idle = self._image_tick % IDLE_FRAME_SKIP != 0
+        width, height = self.simulation.width, self.simulation.height
+        index = SpriteIndex.load()
+        for e, name in self._characters.items():
+            if (e.x + e.width < 0 or e.x > width
+                    or e.y + e.height < 0 or e.y > height):
+                continue
+            state = self._shown[e]
+            if skip_idle and state == "idle":
+                continue
+            frame = (self._frames[e] + 1) % index.cycle_length(
+                name, state, CYCLE_LENGTH)
+            if frame != self._frames[e]:
+                self._frames[e] = frame
+                self._refresh(e)
+
+
+    def apply(self, event):
+        if event.kind == KEY_DOWN:
+            self.controls.key_down(event.key,
+                                   ["shift"] if event.shift else [])
+        elif event.kind == KEY_UP:
+            if self.controls.key_up(event.key):
+                self._show(self.simulation.player)
+
+
+    def tick(self):
+        simulation = self.simulation
+        if self.controls.tick() == CafeControls.MOVE:
+            self._show(simulation.player)
+        for e in simulation.step():
+            self._show(e)
+        if simulation.tick % IMAGE_TICKS == 0:
+            self._animate()
+
+
+    def _step_to(self, tick, start=None):
+        ''' steps the cafe up to a tick, keeping to the pace of the
+        simulation's timestep if a start time is given
+        '''
+        simulation = self.simulation
+        while simulation.tick < tick:
+            if start is not None:
+                delay = (start + simulation.tick * simulation.TIMESTEP
+                         - time.perf_counter())
+                if delay > 0:
+                    time.sleep(delay)
+            self.tick()
+
+
+    def run(self, realtime=False):
+        ''' replays every event, as fast as possible unless in real time,
+        and returns the stats of the replay
+        '''
+        start = time.perf_counter()
+        pace = start if realtime else None
+        for event in self.events:
+            self._step_to(event.tick, pace)
+            self.apply(event)
+        if self.end is not None:
+            self._step_to(self.end[0], pace)
+        elapsed = time.perf_counter() - start
+
+        simulation = self.simulation
+        digest = state_digest(simulation)
+        return {'ticks': simulation.tick,
+                'events': len(self.events),
+                'elapsed_s': elapsed,
+                'ticks_per_s': simulation.tick / max(elapsed, 1e-9),
+                'player': simulation.player.pos,
+                'bag': sorted(simulation.player.bag.items),
+                'digest': digest,
+                'matches': (None if self.end is None
+                            else digest == self.end[1])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay a recorded Monster Cafe input log headless.')
+    parser.add_argument('log', help='the log written with '
+                                    'MONSTERCAFE_RECORD=<file>')
+    parser.add_argument('--realtime', action='store_true',
+                        help='keep to the pace of the game instead of '
+                             'replaying as fast as possible')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='replays the log this many times, reporting '
+                             'every run')
+    args = parser.parse_args()
+
+    header, events, end = read_log(args.log)
+    results = [Replay(header, events, end).run(args.realtime)
+               for i in range(args.repeat)]
+    print (json.dumps(results if args.repeat > 1 else results[0], indent=2))
@@ -0,0 +1,479 @@
+import argparse
+import json
+import random
+import struct
+import zlib
+
+from replay import FOOD_FOLDER, NPC_NAME, frame_file
+from simulation import ItemEntity, NonPlayerEntity
+from spriteindex import food_names
+
+
+MAGIC = b'MCSC'
+VERSION = 1
+# magic, version and length of the JSON header, which is followed by the
+# chunks, each compressed JSON found through the chunk table of the header
+PREAMBLE = struct.Struct('<4sBI')
+
+TILE_SIZE = 32
+CHUNK_SIZE = 16
+# the floor sprite drawn for every character of a tile layer, tiles of
+# other characters being left empty
+TILESET = dict([(str(i), 'floor_' + str(i)) for i in range(1, 9)]
+               + [('W', 'wall_mid')])
+# tiles nothing walks through
+SOLID_TILES = 'W'
+EMPTY_TILE = '.'
+
+
+def camera_at(center, view, world):
+    ''' returns the bottom-left of a view centered on a point as much as
+    it can while staying inside the world
+
+    Keyword arguments:
+    center  -- (x, y) the view is centered on
+    view    -- (width, height) of the view
+    world   -- (width, height) of the world
+    '''
+    return tuple(max(0, min(center[i] - view[i] / 2, world[i] - view[i]))
+                 for i in range(2))
+
+
+class ChunkGrid(object):
+    ''' the tiles of a scene, divided into square chunks of tiles '''
+
+    def __init__(self, cols, rows, tile_size=TILE_SIZE,
+                 chunk_size=CHUNK_SIZE):
+        self.cols, self.rows = cols, rows
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+
+
+    @property
+    def width(self):
+        return self.cols * self.tile_size
+
+
+    @property
+    def height(self):
+        return self.rows * self.tile_size
+
+
+    @property
+    def chunk_pixels(self):
+        return self.chunk_size * self.tile_size
+
+
+    def chunk_of(self, x, y):
+        ''' returns the (col, row) of the chunk a point in pixels is in '''
+        return (int(x // self.chunk_pixels), int(y // self.chunk_pixels))
+
+
+    def clamp_chunk(self, key):
+        ''' returns the chunk inside the scene nearest to a chunk '''
+        cols = -(-self.cols // self.chunk_size)
+        rows = -(-self.rows // self.chunk_size)
+        return (min(max(key[0], 0), cols - 1),
+                min(max(key[1], 0), rows - 1))
+
+
+    def chunk_origin(self, key):
+        ''' returns the bottom-left of a chunk, in pixels '''
+        return (key[0] * self.chunk_pixels, key[1] * self.chunk_pixels)
+
+
+    def chunk_keys(self):
+        cols = -(-self.cols // self.chunk_size)
+        rows = -(-self.rows // self.chunk_size)
+        return [(col, row) for row in range(rows) for col in range(cols)]
+
+
+    def chunks_around(self, key, radius):
+        ''' returns the chunks within a radius of a chunk, inside the scene
+        '''
+        cols = -(-self.cols // self.chunk_size)
+        rows = -(-self.rows // self.chunk_size)
+        return set((col, row)
+                   for col in range(max(key[0] - radius, 0),
+                                    min(key[0] + radius + 1, cols))
+                   for row in range(max(key[1] - radius, 0),
+                                    min(key[1] + radius + 1, rows)))
+
+
+class Scene(ChunkGrid):
+    ''' a cafe described by tile layers, NPCs and items, which is saved
+    divided into chunks, so that only the chunks near the player have to
+    be read while playing
+    '''
+
+    def __init__(self, cols, rows, layers=None, npcs=None, items=None,
+                 start=(0, 0), tileset=None, name='', **kwargs):
+        ''' Keyword arguments:
+        cols, rows  -- size of the scene in tiles
+        layers      -- the tile layers drawn in order, by name, each a
+                       string of a character per tile for every row,
+                       bottom row first
+        npcs        -- the NPCs, each a dict of their name, sprite, x and
+                       y in pixels, and either the patrol offsets or the
+                       route of cells they patrol
+        items       -- the items, each a dict of their food, x and y
+        start       -- where the player starts, in pixels
+        tileset     -- the sprite of every tile character, TILESET if None
+        '''
+        super().__init__(cols, rows, **kwargs)
+        self.layers = layers if layers is not None else {}
+        self.npcs = npcs if npcs is not None else []
+        self.items = items if items is not None else []
+        self.start = tuple(start)
+        self.tileset = tileset if tileset is not None else dict(TILESET)
+        self.name = name
+
+
+    def chunk(self, key):
+        ''' returns the tiles, NPCs and items of a chunk, or None if it is
+        empty
+        '''
+        size = self.chunk_size
+        col, row = key[0] * size, key[1] * size
+        layers = {name: [line[col:col + size]
+                         for line in rows[row:row + size]]
+                  for name, rows in self.layers.items()}
+        npcs = [n for n in self.npcs if self.chunk_of(n['x'], n['y']) == key]
+        items = [i for i in self.items
+                 if self.chunk_of(i['x'], i['y']) == key]
+        if (not npcs and not items
+                and not any(c != EMPTY_TILE for rows in layers.values()
+                            for line in rows for c in line)):
+            return None
+        return {'layers': layers, 'npcs': npcs, 'items': items}
+
+
+    def save(self, filename):
+        ''' writes the scene, chunk by chunk '''
+        chunks, table, offset = [], [], 0
+        for key in self.chunk_keys():
+            chunk = self.chunk(key)
+            if chunk is None:
+                continue
+            data = zlib.compress(
+                json.dumps(chunk, separators=(',', ':')).encode())
+            chunks.append(data)
+            table.append([key[0], key[1], offset, len(data)])
+            offset += len(data)
+
+        header = {'name': self.name, 'cols': self.cols, 'rows': self.rows,
+                  'tile_size': self.tile_size,
+                  'chunk_size': self.chunk_size,
+                  'start': list(self.start), 'tileset': self.tileset,
+                  'layers': list(self.layers),
+                  'sprites': sorted(set(n['sprite'] for n in self.npcs)),
+                  'foods': sorted(set(i['food'] for i in self.items)),
+                  'chunks': table}
+        header = json.dumps(header, separators=(',', ':')).encode()
+        with open(filename, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+            f.write(header)
+            for data in chunks:
+                f.write(data)
+
+
+class SceneFile(ChunkGrid):
+    ''' a saved scene, of which only the header is read at first, every
+    chunk being read from the file when asked for
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            magic, version, length = PREAMBLE.unpack(
+                f.read(PREAMBLE.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("not a version " + str(VERSION)
+                                 + " scene: " + filename)
+            header = json.loads(f.read(length).decode())
+        self._data_start = PREAMBLE.size + length
+
+        super().__init__(header['cols'], header['rows'],
+                         header['tile_size'], header['chunk_size'])
+        self.name = header['name']
+        self.start = tuple(header['start'])
+        self.tileset = header['tileset']
+        self.layers = header['layers']
+        # the NPC sprites and foods shown anywhere in the scene
+        self.sprites = header['sprites']
+        self.foods = header['foods']
+        self._chunks = {(col, row): (offset, length)
+                        for col, row, offset, length in header['chunks']}
+        self.reads = 0
+
+
+    def chunk(self, key):
+        ''' reads the tiles, NPCs and items of a chunk, or returns None if
+        it is empty
+        '''
+        if key not in self._chunks:
+            return None
+        offset, length = self._chunks[key]
+        with open(self.filename, 'rb') as f:
+            f.seek(self._data_start + offset)
+            data = f.read(length)
+        self.reads += 1
+        return json.loads(zlib.decompress(data).decode())
+
+
+class ChunkStreamer(object):
+    ''' keeps the chunks around the player loaded into the simulation,
+    unloading those it leaves behind; NPCs and items of unloaded chunks are
+    kept as records where they were left, and the entities of a chunk are
+    only created again when it is loaded again
+    '''
+    # chunks loaded on every side of the player's chunk; chunks are only
+    # unloaded a chunk further, so that walking along an edge does not
+    # load and unload the same chunk over and over
+    RADIUS = 1
+
+    def __init__(self, scene, simulation, radius=None, on_load=None,
+                 on_unload=None):
+        ''' Keyword arguments:
+        scene       -- the Scene or SceneFile chunks are read from
+        simulation  -- the simulation entities are added to
+        radius      -- chunks loaded on every side of the player's chunk
+        on_load     -- called with the key, tile layers and entities of
+                       every chunk loaded
+        on_unload   -- called with the key and entities of every chunk
+                       unloaded
+        '''
+        self.scene = scene
+        self.simulation = simulation
+        self.radius = radius if radius is not None else self.RADIUS
+        self.on_load = on_load
+        self.on_unload = on_unload
+        # the entities of every loaded chunk, and the record of each
+        self.loaded = {}
+        self._records = {}
+        # the NPCs and items of chunks unloaded, or left by entities
+        self._saved = {}
+        self._walls = {}
+        self._center = None
+
+
+    def follow(self, x, y):
+        ''' loads and unloads chunks if the player entered another chunk,
+        returning the keys of those loaded and unloaded
+        '''
+        key = self.scene.chunk_of(x, y)
+        if key == self._center:
+            return [], []
+        self._center = key
+        wanted = self.scene.chunks_around(key, self.radius)
+        kept = self.scene.chunks_around(key, self.radius + 1)
+
+        unloaded = [k for k in self.loaded if k not in kept]
+        for k in unloaded:
+            self._unload(k)
+        loaded = sorted(k for k in wanted if k not in self.loaded)
+        for k in loaded:
+            self._load(k)
+        return loaded, unloaded
+
+
+    def record(self, entity):
+        ''' returns the record a loaded entity was created from '''
+        return self._records[entity]
+
+
+    def _content(self, key):
+        ''' returns the NPCs and items of a chunk, where they were left '''
+        if key not in self._saved:
+            chunk = self.scene.chunk(key) or {}
+            self._saved[key] = {'npcs': chunk.get('npcs', []),
+                                'items': chunk.get('items', [])}
+        return self._saved[key]
+
+
+    def _load(self, key):
+        chunk = self.scene.chunk(key) or {'layers': {}}
+        content = self._saved.pop(key, None)
+        if content is None:
+            content = {'npcs': chunk.get('npcs', []),
+                       'items': chunk.get('items', [])}
+
+        walls = self._wall_cells(key, chunk['layers'])
+        self.simulation.add_walls(walls)
+        self._walls[key] = walls
+
+        entities = []
+        for record in content['npcs']:
+            e = NonPlayerEntity.from_sprite(
+                frame_file(record['sprite'], 'idle', 0), record['name'],
+                movement_list=record.get('patrol'))
+            e.x, e.y = record['x'], record['y']
+            self.simulation.add_entity(e)
+            if 'route' in record:
+                self.simulation.route_patrol(
+                    e, [tuple(cell) for cell in record['route']])
+            entities.append(e)
+            self._records[e] = record
+        for record in content['items']:
+            e = ItemEntity.from_sprite(FOOD_FOLDER + record['food'] + '.png',
+                                       record['food'].lower())
+            e.x, e.y = record['x'], record['y']
+            self.simulation.add_entity(e)
+            entities.append(e)
+            self._records[e] = record
+        self.loaded[key] = entities
+        if self.on_load is not None:
+            self.on_load(key, chunk['layers'], entities)
+
+
+    def _unload(self, key):
+        ''' removes a chunk along with the entities it loaded, except for
+        those standing in another loaded chunk
+        '''
+        self.simulation.remove_walls(self._walls.pop(key))
+        # whatever the file holds for the chunk is now in its entities
+        self._saved[key] = {'npcs': [], 'items': []}
+        removed = []
+        for e in self.loaded.pop(key):
+            if e not in self.simulation.index:
+                # picked up, or otherwise gone
+                del self._records[e]
+                continue
+            # entities that walked into another loaded chunk go with it,
+            # even if it is about to be unloaded as well; those that got
+            # out of the scene go with the nearest chunk inside it
+            home = self.scene.clamp_chunk(self.scene.chunk_of(e.x, e.y))
+            if home in self.loaded:
+                self.loaded[home].append(e)
+                continue
+            self._save(e, home)
+            removed.append(e)
+        if self.on_unload is not None:
+            self.on_unload(key, removed)
+
+
+    def _save(self, entity, key):
+        ''' removes an entity, recording it in the chunk it stands in '''
+        record = dict(self._records.pop(entity), x=entity.x, y=entity.y)
+        if isinstance(entity, NonPlayerEntity):
+            # the route is found again from here once loaded, as the
+            # offsets left of its patrol only lead the way from where the
+            # NPC started it
+            self._content(key)['npcs'].append(record)
+        else:
+            self._content(key)['items'].append(record)
+        self.simulation.remove_entity(entity)
+
+
+    def _wall_cells(self, key, layers):
+        ''' returns the navigation cells of the solid tiles of a chunk '''
+        col, row = (key[0] * self.scene.chunk_size,
+                    key[1] * self.scene.chunk_size)
+        cells = []
+        for rows in layers.values():
+            for y, line in enumerate(rows):
+                for x, tile in enumerate(line):
+                    if tile in SOLID_TILES:
+                        cells.append((col + x, row + y))
+        return cells
+
+
+def generate_scene(rng, rooms=(3, 2), room_size=(20, 14), npcs=5, items=8):
+    ''' returns a cafe of rooms in a grid, joined by corridors, with NPCs
+    patrolling routes within their room and items on the floor
+
+    Keyword arguments:
+    rng         -- the random generator everything is picked with
+    rooms       -- the (columns, rows) of rooms
+    room_size   -- the (width, height) of every room in tiles, walls
+                   included
+    npcs        -- the NPCs in every room
+    items       -- the items in every room
+    '''
+    gap = 3
+    room_w, room_h = room_size
+    cols = rooms[0] * (room_w + gap) + gap
+    rows = rooms[1] * (room_h + gap) + gap
+    tiles = [[EMPTY_TILE] * cols for y in range(rows)]
+    floors = sorted(k for k in TILESET if k not in SOLID_TILES)
+    foods = food_names()
+
+    def room_origin(room):
+        return (gap + room[0] * (room_w + gap), gap + room[1] * (room_h + gap))
+
+    def floor_cells(room):
+        x0, y0 = room_origin(room)
+        return [(x, y) for y in range(y0 + 1, y0 + room_h - 1)
+                for x in range(x0 + 1, x0 + room_w - 1)]
+
+    for room_x in range(rooms[0]):
+        for room_y in range(rooms[1]):
+            x0, y0 = room_origin((room_x, room_y))
+            for y in range(y0, y0 + room_h):
+                for x in range(x0, x0 + room_w):
+                    wall = (x in (x0, x0 + room_w - 1)
+                            or y in (y0, y0 + room_h - 1))
+                    tiles[y][x] = 'W' if wall else rng.choice(floors)
+
+    # corridors three tiles wide join every room to its right and upper
+    # neighbours, through their walls
+    for room_x in range(rooms[0]):
+        for room_y in range(rooms[1]):
+            x0, y0 = room_origin((room_x, room_y))
+            if room_x + 1 < rooms[0]:
+                middle = y0 + room_h // 2
+                for x in range(x0 + room_w - 1, x0 + room_w + gap + 1):
+                    tiles[middle - 2][x] = tiles[middle + 2][x] = 'W'
+                    for y in range(middle - 1, middle + 2):
+                        tiles[y][x] = rng.choice(floors)
+            if room_y + 1 < rooms[1]:
+                middle = x0 + room_w // 2
+                for y in range(y0 + room_h - 1, y0 + room_h + gap + 1):
+                    tiles[y][middle - 2] = tiles[y][middle + 2] = 'W'
+                    for x in range(middle - 1, middle + 2):
+                        tiles[y][x] = rng.choice(floors)
+
+    npc_list, item_list = [], []
+    for room_x in range(rooms[0]):
+        for room_y in range(rooms[1]):
+            cells = floor_cells((room_x, room_y))
+            for i in range(npcs):
+                x, y = rng.choice(cells)
+                npc_list.append({
+                    'name': NPC_NAME + str(len(npc_list)), 'sprite': NPC_NAME,
+                    'x': x * TILE_SIZE, 'y': y * TILE_SIZE,
+                    'route': [list(rng.choice(cells)) for j in range(3)]})
+            for i in range(items):
+                x, y = rng.choice(cells)
+                item_list.append({'food': rng.choice(foods),
+                                  'x': x * TILE_SIZE, 'y': y * TILE_SIZE})
+
+    x0, y0 = room_origin((0, 0))
+    start = ((x0 + room_w // 2) * TILE_SIZE, (y0 + room_h // 2) * TILE_SIZE)
+    return Scene(cols, rows, {'floor': [''.join(line) for line in tiles]},
+                 npc_list, item_list, start,
+                 name='{}x{} rooms'.format(*rooms))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate a Monster Cafe scene of rooms, to be played '
+                    'with MONSTERCAFE_SCENE=<file>.')
+    parser.add_argument('output', help='the scene file written')
+    parser.add_argument('--rooms', type=int, nargs=2, default=[3, 2],
+                        metavar=('COLS', 'ROWS'))
+    parser.add_argument('--room-size', type=int, nargs=2, default=[20, 14],
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--npcs', type=int, default=5,
+                        help='NPCs in every room')
+    parser.add_argument('--items', type=int, default=8,
+                        help='items in every room')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    scene = generate_scene(random.Random(args.seed), tuple(args.rooms),
+                           tuple(args.room_size), args.npcs, args.items)
+    scene.save(args.output)
+    print ("Saved " + scene.name + " of " + str(scene.cols) + "x"
+           + str(scene.rows) + " tiles, " + str(len(scene.npcs))
+           + " NPCs and " + str(len(scene.items)) + " items")
@@ -0,0 +1,548 @@
+from collisionevents import CollisionEvents
+from collisionmask import MASKS
+from inventory import ItemBag
+from navigation import NavigationGrid, turning_points
+from npcpopulation import NPCPopulation
+from spatialhash import SpatialHash
+from spriteindex import SpriteIndex, index_key
+from timers import TimerQueue
+
+# TODO  Let NPCs collide with each other, not only with the player
+
+
+def spans_overlap(self_start, self_end, other_start, other_end):
+    ''' returns true or false if a span starts or ends within another, or
+    covers it entirely
+    '''
+    overlapping_start = other_start <= self_start < other_end
+    overlapping_end = other_start <= self_end < other_end
+    overlapping_on = self_end > other_end and self_start < other_start
+    return overlapping_start or overlapping_end or overlapping_on
+
+
+def hitboxes_overlap(self_box, other_box):
+    ''' returns true or false if two (left, bottom, right, top) hitboxes
+    overlap
+    '''
+    return (spans_overlap(self_box[0], self_box[2], other_box[0], other_box[2])
+            and spans_overlap(self_box[1], self_box[3],
+                              other_box[1], other_box[3]))
+
+
+class Entity(object):
+    ''' state of anything in the cafe with a position and a hitbox,
+    independent of how it is rendered; the hitbox covers every frame of
+    its sprite, and the collision mask of the current frame decides if it
+    truly overlaps another entity
+    '''
+    STRETCH = 1
+    LEEWAY = 0
+    # if the entity is an obstacle that NPCs path around
+    solid = False
+
+    def __init__(self, name='', x=0, y=0):
+        self.name = name
+        self.x, self.y = x, y
+        # the index key of the sprite frame currently shown
+        self.sprite = None
+        self.width, self.height = 0, 0
+        self.left_pad, self.right_pad = 0, 0
+        self.top_pad, self.bottom_pad = 0, 0
+
+
+    @classmethod
+    def from_sprite(cls, sprite_file, *args, **kwargs):
+        ''' creates an entity sized after a sprite of the sprite index,
+        so that no image has to be loaded
+        '''
+        entity = cls(*args, **kwargs)
+        index = SpriteIndex.load()
+        width, height = index.size(sprite_file)
+        entity.sprite = index_key(sprite_file)
+        entity.set_sprite(width * cls.STRETCH, height * cls.STRETCH,
+                          [p * cls.STRETCH
+                           for p in index.padding(sprite_file)])
+        return entity
+
+
+    @property
+    def pos(self):
+        return (self.x, self.y)
+
+
+    def set_sprite(self, width, height, padding):
+        ''' sets the size of the entity and the transparent padding of its
+        sprite, both already stretched
+        '''
+        self.width, self.height = width, height
+        (self.left_pad, self.right_pad,
+         self.top_pad, self.bottom_pad) = padding
+
+
+    def hitbox(self, leeway=0):
+        ''' returns the (left, bottom, right, top) of the colored part of
+        the entity, grown by the leeway on every side
+        '''
+        return (self.x + self.left_pad - leeway,
+                self.y + self.bottom_pad - leeway,
+                self.x + self.width - self.right_pad + leeway,
+                self.y + self.height - self.top_pad + leeway)
+
+
+    def mask(self, leeway=0):
+        ''' returns the collision mask of the current frame grown by the
+        leeway, or None if the frame has no mask
+        '''
+        if self.sprite is None:
+            return None
+        return MASKS.get(self.sprite, self.STRETCH, leeway)
+
+
+    def is_overlapping(self, other, leeway=None):
+        ''' checks if it's overlapping another entity, both grown by the
+        leeway; the collision masks are compared when both entities have
+        one, otherwise their hitboxes
+        '''
+        if leeway is None:
+            leeway = self.LEEWAY
+        mask, other_mask = self.mask(leeway), other.mask(leeway)
+        if mask is None or other_mask is None:
+            return hitboxes_overlap(self.hitbox(leeway),
+                                    other.hitbox(leeway))
+        return mask.overlaps(self.x, self.y, other_mask, other.x, other.y)
+
+
+class CharacterEntity(Entity):
+    ''' state of a character, which can move around the cafe '''
+    STRETCH = 4
+    MOVEMENT_SPEED = 5
+    MOVE_INCREASE = 3
+
+    def __init__(self, name='', x=0, y=0):
+        super().__init__(name, x, y)
+        self.state = "idle"
+
+
+    def idle(self):
+        self.state = "idle"
+
+
+    def offset(self, direction, sprint=False):
+        ''' returns the pixels moved toward a direction in a single step
+
+        Keyword arguments:
+        direction   -- (x, y) of the unit direction of the movement
+        sprint      -- if the character is sprinting
+        '''
+        speed = self.MOVEMENT_SPEED
+        if sprint:
+            speed *= self.MOVE_INCREASE
+        return (direction[0] * speed, direction[1] * speed)
+
+
+class PlayerEntity(CharacterEntity):
+    ''' state of the player-controlled character '''
+    def __init__(self, name='', x=0, y=0):
+        super().__init__(name, x, y)
+        self.bag = ItemBag()
+
+
+class NonPlayerEntity(CharacterEntity):
+    ''' state of a non-player character, patrolling a list of offsets;
+    the progress of the patrol is kept by the simulation's NPCPopulation
+    '''
+    LEEWAY = 8
+
+    def __init__(self, name='', x=0, y=0, movement_list=None):
+        # the population the NPC belongs to, and its slot in it
+        self.population = None
+        self.slot = None
+        super().__init__(name, x, y)
+        self.set_patrol(movement_list)
+
+
+    # while in a population, the position of the NPC lives in its arrays
+    @property
+    def x(self):
+        if self.population is None:
+            return self._x
+        return float(self.population.x[self.slot])
+
+
+    @x.setter
+    def x(self, value):
+        if self.population is None:
+            self._x = value
+        else:
+            self.population.x[self.slot] = value
+
+
+    @property
+    def y(self):
+        if self.population is None:
+            return self._y
+        return float(self.population.y[self.slot])
+
+
+    @y.setter
+    def y(self, value):
+        if self.population is None:
+            self._y = value
+        else:
+            self.population.y[self.slot] = value
+
+
+    @property
+    def solid(self):
+        ''' NPCs standing still are obstacles to the others '''
+        return not self.movement_list
+
+
+    def set_patrol(self, movement_list=None, one_way=False):
+        ''' sets the places that the NPC is meant to move to
+
+        Keyword arguments:
+        movement_list   --  a list of offsets that the character will
+                            move by in order of the elements
+        one_way         --  if the NPC stops once it moved by every offset,
+                            instead of starting over
+        '''
+        self.movement_list = (movement_list
+                              if movement_list is not None else [])
+        self.one_way = one_way
+        if self.population is not None:
+            self.population.set_patrol(self, self.movement_list, one_way)
+
+
+class ItemEntity(Entity):
+    ''' state of an item that the player can pick up '''
+    STRETCH = 2
+
+
+class Simulation(object):
+    ''' steps the cafe with a fixed timestep, without needing a window;
+    widgets only render the state of its entities
+    '''
+    TIMESTEP = 5.0/60.0
+
+    def __init__(self, width, height, player=None):
+        self.width, self.height = width, height
+        self.entities = []
+        self.index = SpatialHash()
+        self.population = NPCPopulation()
+        self.navigation = NavigationGrid.covering(width, height)
+        # the navigation cells blocked by every solid entity
+        self._obstacles = {}
+        # the navigation cells of walls, which nothing walks through
+        self.walls = set()
+        # the overlaps of the player, dispatched at the end of every tick
+        self.events = CollisionEvents()
+        # calls back on the ticks they are due, before anything moves
+        self.timers = TimerQueue()
+        # decides what the NPCs do next at the start of every tick, if set
+        self.ai = None
+        # the orders of the customers, if the cafe takes any
+        self.orders = None
+        self.player = None
+        self.tick = 0
+        if player is not None:
+            self.add_entity(player)
+
+
+    def add_entity(self, entity):
+        if isinstance(entity, PlayerEntity):
+            self.player = entity
+        if isinstance(entity, NonPlayerEntity):
+            self.population.add(
+                entity, self.index.cell_range(entity.hitbox()))
+        self.entities.append(entity)
+        self.index.insert(entity, entity.hitbox())
+        self._update_obstacle(entity)
+
+
+    def remove_entity(self, entity):
+        if entity is self.player:
+            self.player = None
+        if isinstance(entity, NonPlayerEntity):
+            self.population.remove(entity)
+            if self.ai is not None:
+                self.ai.remove(entity)
+            if self.orders is not None:
+                self.orders.remove(entity)
+        self.entities.remove(entity)
+        self.index.remove(entity)
+        self.navigation.unblock(self._obstacles.pop(entity, ()))
+
+
+    def _update_obstacle(self, entity):
+        ''' blocks the navigation cells under a solid entity, and frees
+        them once it no longer is
+        '''
+        cells = (self.navigation.cells_of(entity.hitbox())
+                 if entity.solid else [])
+        previous = self._obstacles.pop(entity, [])
+        if cells != previous:
+            self.navigation.unblock(previous)
+            self.navigation.block(cells)
+        if cells:
+            self._obstacles[entity] = cells
+
+
+    def obstacle_cells(self, entity):
+        ''' returns the navigation cells a solid entity blocks '''
+        return self._obstacles.get(entity, [])
+
+
+    def add_walls(self, cells):
+        cells = [c for c in cells if c not in self.walls]
+        self.walls.update(cells)
+        self.navigation.block(cells)
+
+
+    def remove_walls(self, cells):
+        cells = [c for c in cells if c in self.walls]
+        self.walls.difference_update(cells)
+        self.navigation.unblock(cells)
+
+
+    def _hits_wall(self, entity, offset):
+        ''' checks if the hitbox of an entity moved by an offset covers
+        a wall
+        '''
+        left, bottom, right, top = entity.hitbox()
+        # a hitbox ending on the edge of a cell does not cover it
+        box = (left + offset[0], bottom + offset[1],
+               right + offset[0] - 1, top + offset[1] - 1)
+        return any(cell in self.walls
+                   for cell in self.navigation.cells_of(box))
+
+
+    def set_patrol(self, entity, movement_list, one_way=False):
+        ''' sets the offsets an NPC patrols, or walks once if one way,
+        updating whether it blocks the others' paths
+        '''
+        entity.set_patrol(movement_list, one_way)
+        self._update_obstacle(entity)
+
+
+    def route_patrol(self, entity, waypoints):
+        ''' sends an NPC on a patrol along the shortest paths through
+        cells of the floor grid and back to where it stands, walking
+        around obstacles; returns if every waypoint could be reached
+
+        Keyword arguments:
+        entity      -- the NPC
+        waypoints   -- the (col, row) of the cells to visit, in order
+        '''
+        offsets = self._route(entity, waypoints, back=True)
+        if offsets is None:
+            return False
+        self.set_patrol(entity, offsets)
+        return True
+
+
+    def route_to(self, entity, goal, limit=None):
+        ''' sends an NPC along the shortest path to a cell of the floor
+        grid, where it stops; returns if the cell could be reached
+
+        Keyword arguments:
+        entity  -- the NPC
+        goal    -- the (col, row) of the cell
+        limit   -- the cells searched for a path at most
+        '''
+        offsets = self._route(entity, [goal], back=False, limit=limit)
+        if offsets is None:
+            return False
+        self.set_patrol(entity, offsets, one_way=True)
+        return True
+
+
+    def _route(self, entity, waypoints, back, limit=None):
+        ''' returns the offsets walking an NPC through cells, and back to
+        where it stands if asked, or None if a cell can't be reached
+        '''
+        navigation = self.navigation
+        navigation.resize(self.width, self.height)
+        # the NPC no longer blocks where it stands while finding its way,
+        # and neither do those it stands in, so that it can walk out
+        navigation.unblock(self._obstacles.pop(entity, ()))
+        box = entity.hitbox()
+        entangled = [cells for e, cells in (
+                         (e, self._obstacles.get(e))
+                         for e in self.index.query(box))
+                     if cells and hitboxes_overlap(box, e.hitbox())]
+        for cells in entangled:
+            navigation.unblock(cells)
+
+        left, bottom, right, top = box
+        center = ((left + right) / 2, (bottom + top) / 2)
+        start = navigation.cell_at(*center)
+        path = [start]
+        for goal in waypoints:
+            leg = navigation.find_path(path[-1], goal, limit)
+            if leg is None:
+                path = None
+                break
+            path.extend(leg[1:])
+        # the way back is found from the start, which may be blocked by
+        # someone standing next to the NPC, before blocking it again
+        if back and path is not None and path[-1] != start:
+            way_back = navigation.find_path(start, path[-1])
+            path = (path + list(reversed(way_back[:-1]))
+                    if way_back is not None else None)
+        for cells in entangled:
+            navigation.block(cells)
+        if path is None:
+            self._update_obstacle(entity)
+            return None
+
+        # offsets are counted in steps, from the center of the NPC to the
+        # center of every cell the path turns at, and back to the start
+        speed = entity.MOVEMENT_SPEED
+        offsets, here = [(0, 0)], (0, 0)
+        for cell in [start] + turning_points(path) + ([None] if back else []):
+            if cell is None:
+                there = (0, 0)
+            else:
+                x, y = navigation.cell_center(cell)
+                there = (round((x - center[0]) / speed),
+                         round((y - center[1]) / speed))
+            if there != here:
+                offsets.append((there[0] - here[0], there[1] - here[1]))
+                here = there
+        return offsets
+
+
+    def move_entity(self, entity, offset):
+        entity.x += offset[0]
+        entity.y += offset[1]
+        self.index.update(entity, entity.hitbox())
+
+
+    def _in_bounds(self, entity, direction):
+        ''' checks if the entity's hitbox stays within the cafe after a
+        step toward the direction at its normal speed
+        '''
+        left, bottom, right, top = entity.hitbox()
+        speed = entity.MOVEMENT_SPEED
+        if direction[0] < 0 and left - speed < 0:
+            return False
+        if direction[0] > 0 and right + speed > self.width:
+            return False
+        if direction[1] < 0 and bottom - speed < 0:
+            return False
+        if direction[1] > 0 and top + speed > self.height:
+            return False
+        return True
+
+
+    def move_player(self, direction, sprint=False):
+        ''' moves the player a step toward a direction, staying inside the
+        cafe and out of its walls, and picks up the items it then
+        overlaps; returns the items picked up and the NPC the player can
+        interact with, if any
+
+        Keyword arguments:
+        direction   -- (x, y) of the unit direction of the movement
+        sprint      -- if the player is sprinting
+        '''
+        if not self._in_bounds(self.player, direction):
+            direction = (0, 0)
+        self.player.state = "run"
+        offset = self.player.offset(direction, sprint)
+        if self.walls and self._hits_wall(self.player, offset):
+            offset = (0, 0)
+        self.move_entity(self.player, offset)
+        return self.check_player_collisions()
+
+
+    def check_player_collisions(self):
+        ''' picks up every item the player overlaps, returning them along
+        with the first NPC overlapping the player, if any; what it overlaps
+        is reported to the collision events of the tick
+        '''
+        picked_up, npc = [], None
+        found = self.overlapping(self.player)
+        self.events.report(self.player, found)
+        for e in found:
+            if isinstance(e, ItemEntity):
+                self.pick_up(e)
+                picked_up.append(e)
+            elif isinstance(e, NonPlayerEntity) and npc is None:
+                npc = e
+        return picked_up, npc
+
+
+    def overlapping(self, entity):
+        ''' returns the entities overlapping an entity; of each pair, the
+        one with the larger leeway checks for the overlap
+        '''
+        # entities grow both hitboxes by their leeway when checking
+        near = self.index.query(entity.hitbox(2 * NonPlayerEntity.LEEWAY))
+        found = []
+        for e in near:
+            if e is entity:
+                continue
+            if e.LEEWAY > entity.LEEWAY:
+                overlapping = e.is_overlapping(entity)
+            else:
+                overlapping = entity.is_overlapping(e)
+            if overlapping:
+                found.append(e)
+        return found
+
+
+    def pick_up(self, item):
+        ''' moves an item from the cafe to the player's bag '''
+        self.player.bag.add_item(item.name)
+        self.remove_entity(item)
+
+
+    def step(self):
+        ''' advances the cafe by a single timestep, returning the entities
+        that moved or stopped, each once; the timers due fire first, then
+        the AI runs, the player is checked against the NPCs once they have
+        moved, and the collision events of the tick are dispatched
+        '''
+        self.timers.run(self.tick)
+        if self.ai is not None:
+            self.ai.run(self.tick)
+
+        # NPCs overlapping the player are stopped by it
+        blocked = []
+        if self.player is not None:
+            for e in self.index.query(self.player.hitbox()):
+                if (isinstance(e, NonPlayerEntity)
+                        and self.player.is_overlapping(e)):
+                    blocked.append(e.slot)
+
+        moved = self.population.step(blocked)
+        npcs = self.population.entities
+        # the slots are read before any NPC is removed, which moves the
+        # last NPC into its slot
+        changed = [npcs[slot] for slot in moved]
+        # only the NPCs whose hitbox entered other cells are re-bucketed
+        for slot in self.population.recell(moved, self.index.cell_size):
+            self.index.update(npcs[slot], npcs[slot].hitbox())
+        # NPCs at the end of a one way route stand where it took them
+        stopped = [npcs[slot] for slot in self.population.ended]
+        for e in stopped:
+            e.idle()
+            self.set_patrol(e, [])
+        changed.extend(stopped)
+
+        if self.player is not None:
+            self.check_player_collisions()
+        self.events.flush()
+        self.tick += 1
+        # handlers of the collision events may have removed some of them
+        return [e for e in dict.fromkeys(changed)
+                if e.population is self.population]
+
+
+    def run(self, ticks):
+        ''' advances the cafe by an amount of timesteps as fast as
+        possible
+        '''
+        for i in range(ticks):
+            self.step()
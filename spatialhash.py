@@ -0,0 +1,95 @@
+import math
+
+
+class SpatialHash(object):
+    ''' uniform grid that buckets objects by the cells their rectangle
+    covers, so that only objects near a rectangle need to be checked for
+    collision
+    '''
+    CELL_SIZE = 64
+
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size if cell_size is not None else self.CELL_SIZE
+        self._buckets = {}
+        # the range of cells each object currently covers
+        self._cells = {}
+
+
+    def __len__(self):
+        return len(self._cells)
+
+
+    def __contains__(self, obj):
+        return obj in self._cells
+
+
+    def cell_range(self, rect):
+        ''' returns the (first column, first row, last column, last row)
+        of the cells covered by a rectangle
+
+        Keyword arguments:
+        rect    -- (left, bottom, right, top) of the rectangle
+        '''
+        left, bottom, right, top = rect
+        return (math.floor(left / self.cell_size),
+                math.floor(bottom / self.cell_size),
+                math.floor(right / self.cell_size),
+                math.floor(top / self.cell_size))
+
+
+    def _iter_cells(self, cell_range):
+        first_col, first_row, last_col, last_row = cell_range
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                yield (col, row)
+
+
+    def insert(self, obj, rect):
+        ''' adds an object covering the rectangle to the grid '''
+        if obj in self._cells:
+            self.update(obj, rect)
+            return
+        cell_range = self.cell_range(rect)
+        self._cells[obj] = cell_range
+        for cell in self._iter_cells(cell_range):
+            self._buckets.setdefault(cell, {})[obj] = None
+
+
+    def update(self, obj, rect):
+        ''' moves an object to the cells covered by its new rectangle; the
+        buckets are only touched if the covered cells changed
+        '''
+        cell_range = self.cell_range(rect)
+        if self._cells.get(obj) == cell_range:
+            return
+        self.remove(obj)
+        self.insert(obj, rect)
+
+
+    def remove(self, obj):
+        ''' removes an object from the grid, if it is in it '''
+        cell_range = self._cells.pop(obj, None)
+        if cell_range is None:
+            return
+        for cell in self._iter_cells(cell_range):
+            bucket = self._buckets[cell]
+            del bucket[obj]
+            if not bucket:
+                del self._buckets[cell]
+
+
+    def query(self, rect):
+        ''' returns the objects sharing a cell with the rectangle; these are
+        only candidates, which still have to be checked for an overlap
+        '''
+        found = {}
+        for cell in self._iter_cells(self.cell_range(rect)):
+            bucket = self._buckets.get(cell)
+            if bucket is not None:
+                found.update(bucket)
+        return list(found)
+
+
+    def clear(self):
+        self._buckets.clear()
+        self._cells.clear()
@@ -0,0 +1,198 @@
+import kivy
+kivy.require('1.10.1')
+
+from kivy.graphics import Color, Mesh
+from kivy.uix.widget import Widget
+
+import numpy
+
+from debugger import profiled
+
+
+class SpriteBatch(Widget):
+    ''' draws the images of many widgets that are not added to the window
+    themselves, with a single mesh for every texture drawn from, so that
+    the sprites of an atlas page take one draw call however many there
+    are; a mesh is dropped once no sprite is drawn from its texture, so
+    that textures evicted from the sprite cache are not kept alive by it;
+    the position, size and texture coordinates of every sprite are
+    kept in arrays, written as its widget changes and turned into the
+    vertices of the meshes when drawn
+    '''
+    CAPACITY = 64
+    # the corners of a sprite, in the order of the texture coordinates of
+    # a texture, and the two triangles drawing them
+    CORNERS = numpy.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+    QUAD = numpy.array([0, 1, 2, 2, 3, 0])
+    # mesh indices are 16 bits, and every sprite has 4 vertices
+    MAX_SPRITES = 65536 // 4
+
+    def __init__(self, capacity=None, **kwargs):
+        super().__init__(**kwargs)
+        capacity = capacity if capacity is not None else self.CAPACITY
+        # the widget of every slot, and the slot of every widget
+        self.sprites = []
+        self._slots = {}
+        self.xy = numpy.zeros((capacity, 2))
+        self.wh = numpy.zeros((capacity, 2))
+        self.uv = numpy.zeros((capacity, 8))
+        # the mesh every sprite is drawn by, -1 for sprites with no texture
+        self.page = numpy.zeros(capacity, dtype=numpy.int64)
+
+        # the mesh drawing every texture, by texture id, and the sprites
+        # drawn by every mesh; atlas regions share the id of their page,
+        # and the meshes dropped leave a None that the next texture takes
+        self._pages = {}
+        self._meshes = []
+        self._users = []
+        self._dirty = False
+        with self.canvas:
+            Color(1, 1, 1, 1)
+
+
+    def __len__(self):
+        return len(self.sprites)
+
+
+    def __contains__(self, widget):
+        return widget in self._slots
+
+
+    def _grow(self):
+        ''' doubles the capacity of every per-sprite array '''
+        for name in ('xy', 'wh', 'uv', 'page'):
+            array = getattr(self, name)
+            grown = numpy.zeros((len(array) * 2,) + array.shape[1:],
+                                dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+
+    def add(self, widget):
+        ''' draws an image widget from now on, following its position,
+        size and texture
+        '''
+        slot = len(self.sprites)
+        if slot == self.MAX_SPRITES:
+            raise ValueError("a sprite batch draws at most "
+                             + str(self.MAX_SPRITES) + " sprites")
+        if slot == len(self.xy):
+            self._grow()
+        self.sprites.append(widget)
+        self._slots[widget] = slot
+        self.xy[slot] = widget.pos
+        self.wh[slot] = widget.size
+        self.page[slot] = -1
+        self._set_texture(slot, widget.texture)
+        widget.bind(pos=self._moved, size=self._resized,
+                    texture=self._retextured)
+        self._dirty = True
+
+
+    def remove(self, widget):
+        ''' stops drawing a widget, moving the last sprite into its slot '''
+        widget.unbind(pos=self._moved, size=self._resized,
+                      texture=self._retextured)
+        slot, last = self._slots.pop(widget), len(self.sprites) - 1
+        self._release(int(self.page[slot]))
+        moved = self.sprites.pop()
+        if moved is not widget:
+            self.sprites[slot] = moved
+            self._slots[moved] = slot
+            for name in ('xy', 'wh', 'uv', 'page'):
+                array = getattr(self, name)
+                array[slot] = array[last]
+        self._dirty = True
+
+
+    def _set_texture(self, slot, texture):
+        ''' draws a sprite by the mesh of a texture, letting go of the one
+        it was drawn by
+        '''
+        previous = int(self.page[slot])
+        page = -1
+        if texture is not None:
+            page = self._pages.get(texture.id)
+            if page is None:
+                page = self._add_mesh(texture)
+            self._users[page] += 1
+            self.uv[slot] = texture.tex_coords
+        self.page[slot] = page
+        self._release(previous)
+
+
+    def _add_mesh(self, texture):
+        ''' returns the page of a new mesh drawing from a texture '''
+        mesh = Mesh(mode='triangles', texture=texture)
+        self.canvas.add(mesh)
+        if None in self._meshes:
+            page = self._meshes.index(None)
+            self._meshes[page] = mesh
+        else:
+            page = len(self._meshes)
+            self._meshes.append(mesh)
+            self._users.append(0)
+        self._pages[texture.id] = page
+        return page
+
+
+    def _release(self, page):
+        ''' drops the mesh of a page once no sprite is drawn by it '''
+        if page < 0:
+            return
+        self._users[page] -= 1
+        if self._users[page] == 0:
+            mesh = self._meshes[page]
+            self.canvas.remove(mesh)
+            del self._pages[mesh.texture.id]
+            self._meshes[page] = None
+
+
+    def _moved(self, widget, pos):
+        self.xy[self._slots[widget]] = pos
+        self._dirty = True
+
+
+    def _resized(self, widget, size):
+        self.wh[self._slots[widget]] = size
+        self._dirty = True
+
+
+    def _retextured(self, widget, texture):
+        self._set_texture(self._slots[widget], texture)
+        self._dirty = True
+
+
+    @profiled('SpriteBatch.draw')
+    def draw(self):
+        ''' rebuilds the vertices of every mesh, if a sprite changed since
+        they were last built
+        '''
+        if not self._dirty:
+            return
+        self._dirty = False
+        count = len(self.sprites)
+        # (x, y, u, v) of the 4 corners of every sprite
+        vertices = numpy.empty((count, 4, 4))
+        vertices[:, :, :2] = (self.xy[:count, None, :]
+                              + self.CORNERS * self.wh[:count, None, :])
+        vertices[:, :, 2:] = self.uv[:count].reshape(count, 4, 2)
+
+        pages = self.page[:count]
+        for page, mesh in enumerate(self._meshes):
+            if mesh is None:
+                continue
+            quads = vertices[pages == page]
+            mesh.vertices = quads.ravel().tolist()
+            mesh.indices = (numpy.arange(len(quads))[:, None] * 4
+                            + self.QUAD).ravel().tolist()
+
+
+    def stats(self):
+        ''' returns the sprites drawn and the meshes drawing them, of
+        which those holding any sprite take a draw call each
+        '''
+        pages = self.page[:len(self.sprites)]
+        meshes = len(self._meshes) - self._meshes.count(None)
+        return {'sprites': len(self.sprites), 'meshes': meshes,
+                'draw_calls': len(set(pages[pages >= 0].tolist()))}
@@ -0,0 +1,117 @@
+import kivy
+kivy.require('1.10.1')
+
+from kivy.core.image import Image as CoreImage
+
+import collections
+import os
+
+from debugger import Debug, PROFILER
+from spriteindex import index_key
+
+
+class SpriteCache(Debug):
+    ''' textures of sprite files, shared by every widget showing them and
+    kept within a budget of bytes by evicting the least recently used;
+    only the textures are kept, never the pixel data they were made from
+
+    textures are keyed by (sheet, frame), the folder of a sprite and the
+    name of its file without extension
+    '''
+    BUDGET = 16 * 1024 * 1024
+    BYTES_PER_PIXEL = 4
+
+    def __init__(self, budget=None):
+        ''' Keyword arguments:
+        budget  -- the bytes the textures may take before the least
+                   recently used are evicted
+        '''
+        self.budget = budget if budget is not None else self.BUDGET
+        self._entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+    @staticmethod
+    def sprite_file(sheet, frame):
+        return sheet + '/' + frame + '.png'
+
+
+    @staticmethod
+    def key_of(filename):
+        ''' returns the (sheet, frame) of a sprite file '''
+        sheet, name = os.path.split(index_key(filename))
+        return sheet, os.path.splitext(name)[0]
+
+
+    def cost(self, texture):
+        return texture.width * texture.height * self.BYTES_PER_PIXEL
+
+
+    def texture(self, sheet, frame):
+        ''' returns the texture of a sprite, loading it the first time it
+        is asked for since it was last evicted, or None if it can't be
+        loaded
+        '''
+        key = (sheet, frame)
+        texture = self._entries.get(key)
+        if texture is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return texture
+
+        self.misses += 1
+        PROFILER.count('texture_loads')
+        try:
+            texture = CoreImage(self.sprite_file(sheet, frame),
+                                nocache=True).texture
+        except Exception as e:
+            self.debugPrint(type(self).__name__, "texture", str(e))
+            return None
+        self.put(key, texture)
+        return texture
+
+
+    def put(self, key, texture):
+        ''' adds a texture loaded elsewhere, such as by the preloader '''
+        if key in self._entries:
+            self.bytes -= self.cost(self._entries.pop(key))
+        self._entries[key] = texture
+        self.bytes += self.cost(texture)
+        self._evict()
+
+
+    def _evict(self):
+        ''' drops the least recently used textures until within budget;
+        widgets still showing one keep it alive until they change texture
+        '''
+        # the latest texture is kept even if alone it exceeds the budget
+        while self.bytes > self.budget and len(self._entries) > 1:
+            key, texture = self._entries.popitem(last=False)
+            self.bytes -= self.cost(texture)
+            self.evictions += 1
+
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.bytes,
+                'budget': self.budget, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+# the sprite cache shared by the whole game
+SPRITES = SpriteCache()
@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import hashlib
+
+# TODO  Also record per-frame data for the floor tiles once they are
+#       needed by something other than the Floor class
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INDEX_FILE = os.path.join(ROOT, 'Images', 'sprite_index.json')
+SPRITE_FOLDERS = ['Images/chars/*', 'Images/food', 'Images/weapons']
+
+
+def index_key(filename):
+    ''' returns the key under which a sprite is stored in the index, which
+    is its path relative to the project using forward slashes
+
+    Keyword arguments:
+    filename    -- relative or absolute path of the sprite
+    '''
+    filename = filename.replace('\\', '/')
+    if os.path.isabs(filename):
+        filename = os.path.relpath(filename, ROOT).replace(os.sep, '/')
+    return filename
+
+
+class SpriteIndex(object):
+    ''' precomputed sprite metadata read at startup instead of inspecting
+    the pixels of every image
+    '''
+    VERSION = 2
+    FRAME_PATTERN = re.compile(r'^(.+)_([a-z]+)_anim_f(\d+)\.png$')
+
+    _loaded = None
+
+    def __init__(self, files=None, cycles=None):
+        self.files = files if files is not None else {}
+        self.cycles = cycles if cycles is not None else {}
+        # paddings shared by every frame of a character, found on demand
+        self._paddings = {}
+
+
+    @classmethod
+    def load(cls, filename=INDEX_FILE):
+        ''' returns the index stored on disk, reading the file only once;
+        an empty index is returned if there is no usable file
+        '''
+        if cls._loaded is None:
+            try:
+                with open(filename) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get('version') != cls.VERSION:
+                data = {}
+            cls._loaded = cls(data.get('files'), data.get('cycles'))
+        return cls._loaded
+
+
+    def save(self, filename=INDEX_FILE):
+        data = {'version': self.VERSION,
+                'files': self.files,
+                'cycles': self.cycles}
+        with open(filename, 'w') as f:
+            json.dump(data, f, separators=(',', ':'), sort_keys=True)
+
+
+    def padding(self, filename):
+        ''' returns the (left, right, top, bottom) transparent padding of
+        a sprite, or None if it has not been indexed; the padding of an
+        animation frame is the one shared by every frame of the character,
+        so that a hitbox made from it covers all of them
+        '''
+        key = index_key(filename)
+        if key not in self.files:
+            return None
+        if key not in self._paddings:
+            frames = self.frames_of(key)
+            padding = tuple(min(self.files[f]['padding'][i] for f in frames)
+                            for i in range(4))
+            for f in frames:
+                self._paddings[f] = padding
+        return self._paddings[key]
+
+
+    def frames_of(self, filename):
+        ''' returns the keys of every frame of every animation of the
+        character a sprite is a frame of, or only its own key if it is not
+        an animation frame
+        '''
+        key = index_key(filename)
+        folder, name = key.rsplit('/', 1)
+        match = self.FRAME_PATTERN.match(name)
+        if match is None:
+            return [key]
+        frames = []
+        for f in self.files:
+            f_folder, f_name = f.rsplit('/', 1)
+            other = self.FRAME_PATTERN.match(f_name)
+            if (f_folder == folder and other is not None
+                    and other.group(1) == match.group(1)):
+                frames.append(f)
+        return frames
+
+
+    def mask(self, filename):
+        ''' returns the rows of the collision mask of a sprite, bottom row
+        first, or None if it has not been indexed
+        '''
+        entry = self.files.get(index_key(filename))
+        if entry is None:
+            return None
+        return entry['mask']
+
+
+    def size(self, filename):
+        ''' returns the (width, height) of a sprite, or None if it has not
+        been indexed
+        '''
+        entry = self.files.get(index_key(filename))
+        if entry is None:
+            return None
+        return tuple(entry['size'])
+
+
+    def cycle_length(self, image_name, image_state, default=None):
+        ''' returns the amount of frames in a character's animation '''
+        return self.cycles.get(image_name, {}).get(image_state, default)
+
+
+    def update(self, force=False):
+        ''' scans every sprite that is new or has changed since the last
+        update, and drops the ones that no longer exist; returns the keys
+        of the rescanned sprites
+
+        Keyword arguments:
+        force   -- rescan every sprite regardless of its timestamps
+        '''
+        rescanned = []
+        files = {}
+        for key in find_sprites():
+            path = os.path.join(ROOT, key)
+            mtime = os.path.getmtime(path)
+            entry = self.files.get(key)
+
+            if not force and entry is not None:
+                if entry['mtime'] == mtime:
+                    files[key] = entry
+                    continue
+                digest = _file_hash(path)
+                if entry['hash'] == digest:
+                    entry['mtime'] = mtime
+                    files[key] = entry
+                    continue
+
+            files[key] = _scan_sprite(path, mtime)
+            rescanned.append(key)
+
+        self.files = files
+        self.cycles = _count_frames(files, self.FRAME_PATTERN)
+        return rescanned
+
+
+def find_sprites():
+    ''' returns the index keys of every sprite in the sprite folders '''
+    keys = []
+    for folder in SPRITE_FOLDERS:
+        base = folder.rstrip('*').rstrip('/')
+        if folder.endswith('*'):
+            directories = [os.path.join(base, d) for d in
+                           sorted(os.listdir(os.path.join(ROOT, base)))]
+        else:
+            directories = [base]
+
+        for d in directories:
+            if not os.path.isdir(os.path.join(ROOT, d)):
+                continue
+            for file in sorted(os.listdir(os.path.join(ROOT, d))):
+                if file.endswith('.png'):
+                    keys.append(d.replace(os.sep, '/') + '/' + file)
+    return keys
+
+
+def food_names():
+    ''' returns the name of every food sprite, as used by Item '''
+    return [key[len('Images/food/'):-len('.png')]
+            for key in sorted(SpriteIndex.load().files)
+            if key.startswith('Images/food/')]
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _scan_sprite(path, mtime):
+    ''' loads a sprite and computes its index entry '''
+    # kivy is only needed when sprites actually have to be scanned
+    from kivy.core.image import ImageLoader
+    from collisionmask import CollisionMask
+    from imagelib import find_mask
+
+    image = ImageLoader.load(path, keep_data=True)
+    data = image._data[0]
+    rows = find_mask(data)
+    return {'mtime': mtime,
+            'hash': _file_hash(path),
+            'size': [data.width, data.height],
+            'padding': list(CollisionMask(rows, data.width).padding()),
+            'mask': rows}
+
+
+def _count_frames(files, pattern):
+    ''' returns the amount of frames of every animation, per character '''
+    cycles = {}
+    for key in files:
+        match = pattern.match(key.rsplit('/', 1)[-1])
+        if match is None:
+            continue
+        name, state = match.group(1), match.group(2)
+        states = cycles.setdefault(name, {})
+        states[state] = max(states.get(state, 0), int(match.group(3)) + 1)
+    return cycles
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # kivy, imported to scan sprites, must not parse the arguments
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+    parser = argparse.ArgumentParser(
+        description='Precompute sprite hitboxes, collision masks and '
+                    'animation lengths.')
+    parser.add_argument('--force', action='store_true',
+                        help='rescan every sprite')
+    args = parser.parse_args()
+
+    index = SpriteIndex.load()
+    rescanned = index.update(force=args.force)
+    index.save()
+    print ("Indexed " + str(len(index.files)) + " sprites, rescanned "
+           + str(len(rescanned)))
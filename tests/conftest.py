@@ -0,0 +1,7 @@
+import os
+
+# kivy reads these on import: the tests run without a display, and pytest's
+# arguments are not kivy's
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
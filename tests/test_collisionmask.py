@@ -0,0 +1,21 @@
+import numpy
+
+from collisionmask import CollisionMask, mask_rows
+
+
+def test_mask_rows_are_bottom_first():
+    # a 10 x 4 image, top row first, colored from column 1 to 7 on the
+    # two rows under the top one
+    opaque = numpy.zeros((4, 10), dtype=bool)
+    opaque[1:3, 1:8] = True
+    rows = mask_rows(opaque)
+    assert rows == [0, 0b11111110, 0b11111110, 0]
+
+
+def test_padding_of_the_colored_pixels():
+    opaque = numpy.zeros((4, 10), dtype=bool)
+    opaque[0, 1:8] = True
+    opaque[1, 2] = True
+    mask = CollisionMask(mask_rows(opaque), 10)
+    # (left, right, top, bottom)
+    assert mask.padding() == (1, 2, 0, 2)
@@ -0,0 +1,23 @@
+import pytest
+
+kivy_window = pytest.importorskip('kivy.core.window')
+if kivy_window.Window is None:
+    pytest.skip("no window to render text with", allow_module_level=True)
+
+from kivy.graphics import RoundedRectangle
+
+from dialogueboxes import DialogueBox
+
+
+def backgrounds(box):
+    return [i for i in box.canvas.before.children
+            if isinstance(i, RoundedRectangle)]
+
+
+def test_every_box_draws_its_own_background():
+    first, second = DialogueBox(), DialogueBox()
+    assert backgrounds(first) and backgrounds(second)
+    assert backgrounds(first)[0] is not backgrounds(second)[0]
+
+    first.canvas.before.clear()
+    assert len(backgrounds(second)) == 1
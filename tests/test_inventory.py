@@ -0,0 +1,29 @@
+import pytest
+
+from inventory import ItemBag
+
+
+@pytest.mark.parametrize('count', [0, -1])
+def test_non_positive_counts_are_rejected(count):
+    bag = ItemBag(['apple', 'apple'])
+    with pytest.raises(ValueError):
+        bag.add_item('apple', count)
+    with pytest.raises(ValueError):
+        bag.delete_item('apple', count)
+    # not even looked up in a bag that does not hold it
+    with pytest.raises(ValueError):
+        bag.delete_item('pear', count)
+    with pytest.raises(ValueError):
+        bag.take_items({'apple': 1, 'pear': count})
+    with pytest.raises(ValueError):
+        bag.add_items({'pear': count})
+    assert bag.count('apple') == 2 and len(bag) == 2
+    assert 'pear' not in bag
+
+
+def test_take_items_takes_all_or_none():
+    bag = ItemBag({'apple': 2, 'pear': 1})
+    assert not bag.take_items(['apple', 'pear', 'pear'])
+    assert len(bag) == 3
+    assert bag.take_items(['apple', 'pear'])
+    assert list(bag) == [('apple', 1)]
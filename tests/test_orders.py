@@ -0,0 +1,57 @@
+from inventory import ItemBag
+from orders import COOKING, LEFT, PLACED, READY, SERVED, CafeOrders
+from simulation import Simulation
+
+
+def cafe(cooks=1):
+    simulation = Simulation(200, 150)
+    orders = CafeOrders(simulation, foods=['Apple'])
+    orders.COOKS = cooks
+    events = []
+    orders.bind(lambda kind, order: events.append((kind, order.number)))
+    dishes = []
+    orders.spawn = lambda food, pos: dishes.append(pos)
+    return simulation, orders, events, dishes
+
+
+def run(simulation, ticks):
+    for i in range(ticks):
+        simulation.timers.run(simulation.timers.tick + 1)
+
+
+def test_close_is_dispatched_before_the_next_order_cooks():
+    simulation, orders, events, dishes = cafe()
+    first, second = object(), object()
+    orders.place(first, ['Apple'])
+    orders.place(second, ['Apple'])
+    orders.remove(first)
+    assert events == [(PLACED, 1), (COOKING, 1), (PLACED, 2), (LEFT, 1),
+                      (COOKING, 2)]
+
+
+def test_serving_frees_a_cook_after_dispatching():
+    simulation, orders, events, dishes = cafe()
+    first, second, third = object(), object(), object()
+    orders.place(first, ['Apple'])
+    run(simulation, CafeOrders.COOK_TICKS)
+    orders.place(second, ['Apple'])
+    orders.place(third, ['Apple'])
+    # the second order is cooking and the third waits for the cook
+    orders.remove(second)
+    assert events[-2:] == [(LEFT, 2), (COOKING, 3)]
+    assert orders.serve(first, ItemBag(['apple'])) is not None
+    assert events[-1] == (SERVED, 1)
+    assert orders.stats()['cooking'] == 1
+
+
+def test_dishes_are_put_out_within_the_cafe():
+    simulation, orders, events, dishes = cafe(cooks=2)
+    for i in range(CafeOrders.DISH_SPOTS):
+        orders.place(object(), ['Apple'])
+    run(simulation, CafeOrders.COOK_TICKS * CafeOrders.DISH_SPOTS // 2)
+    assert len(dishes) == CafeOrders.DISH_SPOTS
+    assert [kind for kind, number in events].count(READY) == len(dishes)
+    size = simulation.navigation.cell_size
+    for x, y in dishes:
+        assert 0 <= x <= simulation.width - size
+        assert 0 <= y <= simulation.height - size
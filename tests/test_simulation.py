@@ -0,0 +1,57 @@
+from collisionevents import ENTER
+from simulation import NonPlayerEntity, PlayerEntity, Simulation
+
+
+SPRITE = 'Images/chars/imp/imp_idle_anim_f0.png'
+PLAYER_SPRITE = 'Images/chars/skelet/skelet_idle_anim_f0.png'
+
+
+def npc(simulation, x, y, movement_list=None):
+    e = NonPlayerEntity.from_sprite(SPRITE, 'imp', x, y,
+                                    movement_list=movement_list)
+    simulation.add_entity(e)
+    return e
+
+
+def test_route_without_a_way_back_fails(monkeypatch):
+    simulation = Simulation(640, 480)
+    e = npc(simulation, 100, 100)
+    other = npc(simulation, 110, 100)
+    blocked = dict(simulation.navigation.obstacles)
+    find_path = simulation.navigation.find_path
+    searches = []
+
+    def no_way_back(start, goal, limit=None):
+        # the way there is found, and the way back searched after it not
+        searches.append((start, goal))
+        return find_path(start, goal, limit) if len(searches) == 1 else None
+
+    monkeypatch.setattr(simulation.navigation, 'find_path', no_way_back)
+    assert not simulation.route_patrol(e, [(15, 10)])
+    assert len(searches) == 2
+    assert e.movement_list == []
+    # the NPC and the one it stands in block their cells again
+    assert simulation.navigation.obstacles == blocked
+    assert simulation.obstacle_cells(other)
+
+
+def test_step_returns_every_changed_npc_once():
+    player = PlayerEntity.from_sprite(PLAYER_SPRITE, 'player', 0, 0)
+    simulation = Simulation(640, 480, player)
+    # the NPC met by the player takes the first slot, and leaves the
+    # cafe once met, which moves the last NPC into its slot
+    met = npc(simulation, 0, 0)
+    walkers = [npc(simulation, 300, 100 + 150 * i,
+                   movement_list=[(0, 0), (50, 0), (-50, 0)])
+               for i in range(2)]
+
+    def leave(events):
+        for event in events:
+            if event.kind == ENTER and event.other is met:
+                simulation.remove_entity(met)
+
+    simulation.events.bind(leave)
+    changed = simulation.step()
+    assert met not in simulation.entities
+    assert sorted(changed, key=id) == sorted(walkers, key=id)
+    assert len(changed) == len(set(changed))
@@ -0,0 +1,35 @@
+import pytest
+
+kivy_window = pytest.importorskip('kivy.core.window')
+if kivy_window.Window is None:
+    pytest.skip("no window to draw textures with", allow_module_level=True)
+
+from kivy.uix.image import Image
+
+from spritebatch import SpriteBatch
+from spritecache import SpriteCache
+
+
+SHEET = 'Images/chars/big_demon'
+FRAMES = ['big_demon_' + animation + '_anim_f' + str(i)
+          for animation in ('idle', 'run') for i in range(4)]
+
+
+def test_meshes_of_evicted_textures_are_dropped():
+    # room for two frames, so that cycling through them evicts every one
+    cache = SpriteCache(budget=2 * 32 * 36 * SpriteCache.BYTES_PER_PIXEL)
+    batch = SpriteBatch()
+    widgets = [Image() for i in range(3)]
+    for w in widgets:
+        batch.add(w)
+    for turn in range(5):
+        for i, frame in enumerate(FRAMES):
+            widgets[i % len(widgets)].texture = cache.texture(SHEET, frame)
+            batch.draw()
+            assert batch.stats()['meshes'] <= len(widgets)
+    assert cache.evictions > 0
+
+    for w in widgets:
+        batch.remove(w)
+    batch.draw()
+    assert batch.stats() == {'sprites': 0, 'meshes': 0, 'draw_calls': 0}
@@ -0,0 +1,50 @@
+import kivy
+kivy.require('1.10.1')
+
+from kivy.core.text import Label as CoreLabel
+
+from debugger import PROFILER
+from spritecache import SpriteCache
+
+
+class TextCache(SpriteCache):
+    ''' textures of rendered text, shared by every widget showing the same
+    string in the same style, so that a string is only rasterized again
+    once it has been evicted; kept within a budget of bytes like sprites
+
+    textures are keyed by (text, style), style being the sorted items of
+    the keyword arguments of the core label rendering the text
+    '''
+    BUDGET = 4 * 1024 * 1024
+
+    @staticmethod
+    def style_key(style):
+        return tuple(sorted(style.items()))
+
+
+    def render(self, text, **style):
+        ''' returns the texture of a string, rendering it the first time it
+        is asked for since it was last evicted
+
+        Keyword arguments:
+        text    -- the string rendered
+        style   -- the font_size, color and other properties of the core
+                   label, with hashable values
+        '''
+        key = (text, self.style_key(style))
+        texture = self._entries.get(key)
+        if texture is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return texture
+
+        self.misses += 1
+        PROFILER.count('text_renders')
+        label = CoreLabel(text=text, **style)
+        label.refresh()
+        self.put(key, label.texture)
+        return label.texture
+
+
+# the text cache shared by the whole game
+TEXTS = TextCache()
@@ -0,0 +1,97 @@
+import heapq
+
+
+class Timer(object):
+    ''' a callback due on a tick of the simulation, until cancelled '''
+
+    def __init__(self, tick, callback, args):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerQueue(object):
+    ''' calls back on ticks of the simulation, keeping its timers in a
+    heap so that scheduling and firing a timer take O(log n) whatever the
+    amount pending, and nothing is done on ticks no timer is due; timers
+    due on the same tick fire in the order they were scheduled
+
+    cancelled timers stay in the heap until they are due, unless they
+    outnumber the others, in which case the heap is rebuilt without them
+    '''
+    # pending timers below which cancelled ones are never swept
+    SWEEP_SIZE = 64
+
+    def __init__(self, tick=0):
+        # the tick run last, from which delays are counted
+        self.tick = tick
+        # (tick, order, timer) of every timer not yet fired
+        self._heap = []
+        self._order = 0
+        self._cancelled = 0
+        self.fired = 0
+
+
+    def __len__(self):
+        ''' returns the amount of timers pending, cancelled ones left out '''
+        return len(self._heap) - self._cancelled
+
+
+    def schedule(self, delay, callback, *args):
+        ''' calls a callback with some arguments once a number of ticks
+        passed, returning its Timer
+
+        Keyword arguments:
+        delay       -- the ticks from the last tick run, 0 firing it with
+                       the timers of the next
+        callback    -- called with the arguments when the timer fires
+        '''
+        timer = Timer(self.tick + max(delay, 0), callback, args)
+        heapq.heappush(self._heap, (timer.tick, self._order, timer))
+        self._order += 1
+        return timer
+
+
+    def cancel(self, timer):
+        ''' keeps a timer from firing; cancelling it again does nothing '''
+        if timer is None or timer.cancelled or timer.callback is None:
+            return
+        timer.cancelled = True
+        self._cancelled += 1
+        if (len(self._heap) > self.SWEEP_SIZE
+                and self._cancelled * 2 > len(self._heap)):
+            self._heap = [entry for entry in self._heap
+                          if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+
+    def run(self, tick):
+        ''' fires every timer due by a tick, including those scheduled by
+        the callbacks to fire by then
+        '''
+        self.tick = tick
+        # callbacks cancelling timers may sweep the heap into a new one
+        while self._heap and self._heap[0][0] <= tick:
+            timer = heapq.heappop(self._heap)[2]
+            if timer.cancelled:
+                self._cancelled -= 1
+                continue
+            callback, timer.callback = timer.callback, None
+            self.fired += 1
+            callback(*timer.args)
+
+
+    def next_tick(self):
+        ''' returns the tick the next timer is due on, or None '''
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+        return heap[0][0] if heap else None
+
+
+    def stats(self):
+        return {'pending': len(self), 'cancelled': self._cancelled,
+                'fired': self.fired}
@@ -0,0 +1,100 @@
+class WidgetPool(object):
+    ''' keeps released widgets of a class to hand them out again, so that
+    widgets shown over and over are not created, with their kv rules and
+    canvas, every time; a recycled widget is given its new state through
+    its recycle method
+    '''
+    # the most released widgets kept, the others are left to be collected
+    MAX_FREE = 64
+
+    def __init__(self, factory, max_free=None):
+        ''' Keyword arguments:
+        factory     -- creates a new widget from the keyword arguments of
+                       acquire, usually the class of the widget
+        max_free    -- the most released widgets kept
+        '''
+        self.factory = factory
+        self.max_free = max_free if max_free is not None else self.MAX_FREE
+        self._free = []
+        self.created = 0
+        self.reused = 0
+        self.dropped = 0
+
+
+    def __len__(self):
+        ''' returns the amount of widgets waiting to be reused '''
+        return len(self._free)
+
+
+    def acquire(self, **state):
+        ''' returns a released widget given a new state, or a new widget
+        created with it if none is left
+        '''
+        if self._free:
+            widget = self._free.pop()
+            widget.recycle(**state)
+            self.reused += 1
+            return widget
+        self.created += 1
+        return self.factory(**state)
+
+
+    def release(self, widget):
+        ''' takes back a widget no longer shown, removing it from its
+        parent
+        '''
+        if widget.parent is not None:
+            widget.parent.remove_widget(widget)
+        if len(self._free) >= self.max_free:
+            self.dropped += 1
+            return
+        self._free.append(widget)
+
+
+    def clear(self):
+        self._free = []
+
+
+    def stats(self):
+        return {'free': len(self._free), 'created': self.created,
+                'reused': self.reused, 'dropped': self.dropped}
+
+
+class WidgetPools(object):
+    ''' a WidgetPool for every class of widget, created the first time a
+    widget of the class is acquired
+    '''
+
+    def __init__(self, max_free=None):
+        self.max_free = max_free
+        self._pools = {}
+
+
+    def pool(self, cls):
+        if cls not in self._pools:
+            self._pools[cls] = WidgetPool(cls, self.max_free)
+        return self._pools[cls]
+
+
+    def acquire(self, cls, **state):
+        return self.pool(cls).acquire(**state)
+
+
+    def release(self, widget):
+        ''' takes back a widget into the pool of its class '''
+        self.pool(type(widget)).release(widget)
+
+
+    def clear(self):
+        for pool in self._pools.values():
+            pool.clear()
+
+
+    def stats(self):
+        ''' returns the stats of every pool, by class name '''
+        return {cls.__name__: pool.stats()
+                for cls, pool in self._pools.items()}
+
+
+# the pools shared by the whole game
+POOLS = WidgetPools()